@@ -6,14 +6,21 @@ import numpy as np
 from typing import Dict, List, Any, Optional
 from loguru import logger
 
+# Pixels per real-world meter at scale 1/1, for a 300 DPI scan:
+# 300 px/inch * 0.3937 inch/cm * 100 cm/m
+_PX_PER_M_PER_SCALE = 300.0 * 0.3937 * 100.0
+_FT_PER_M = 0.3048
+
 
 class AreaAnalyzer:
     """محلل المساحات"""
     
     def __init__(self):
         self.pixels_per_meter = None
+        self._inv_ppm = 1.0
+        self._inv_ppm2 = 1.0
     
-    async def analyze(
+    def analyze(
         self,
         elements: Dict[str, Any],
         scale: Optional[float],
@@ -35,17 +42,21 @@ class AreaAnalyzer:
             
             # Estimate scale if not provided
             if scale is None:
-                scale = await self._estimate_scale(elements)
-                logger.info(f"📏 Estimated scale: 1/{scale}")
+                scale = self._estimate_scale(elements)
+                logger.info("📏 Estimated scale: 1/{}", scale)
             
             # Calculate conversion factor
-            self.pixels_per_meter = await self._calculate_conversion(scale, unit)
+            self.pixels_per_meter = self._calculate_conversion(scale, unit)
+            
+            # Reciprocals computed once so conversion is a single multiply
+            self._inv_ppm = 1.0 / self.pixels_per_meter if self.pixels_per_meter else 1.0
+            self._inv_ppm2 = self._inv_ppm * self._inv_ppm
             
             # Convert all measurements
-            converted_elements = await self._convert_measurements(elements)
+            converted_elements = self._convert_measurements(elements)
             
             # Calculate summary metrics
-            metrics = await self._calculate_metrics(converted_elements)
+            metrics = self._calculate_metrics(converted_elements)
             
             result = {
                 "scale": scale,
@@ -61,7 +72,7 @@ class AreaAnalyzer:
             logger.error(f"❌ Error analyzing areas: {str(e)}")
             raise
     
-    async def _estimate_scale(self, elements: Dict) -> float:
+    def _estimate_scale(self, elements: Dict) -> float:
         """
         تقدير المقياس من حجم الأبواب
         (الأبواب عادة 0.8-1.2 متر)
@@ -74,7 +85,7 @@ class AreaAnalyzer:
             return 100.0
         
         # Average door width in pixels
-        avg_door_width_px = np.mean([d["width"] for d in doors])
+        avg_door_width_px = float(self._column(doors, "width").mean())
         
         # Assume standard door width of 0.9m
         standard_door_m = 0.9
@@ -91,7 +102,7 @@ class AreaAnalyzer:
         
         return estimated_scale
     
-    async def _calculate_conversion(self, scale: float, unit: str) -> float:
+    def _calculate_conversion(self, scale: float, unit: str) -> float:
         """
         حساب معامل التحويل من بكسل إلى وحدة حقيقية
         
@@ -102,64 +113,42 @@ class AreaAnalyzer:
         Returns:
             عدد البكسل في المتر الواحد
         """
-        # Assume 300 DPI scan
-        dpi = 300
-        
-        # Pixels per inch
-        px_per_inch = dpi
-        
-        # Convert scale drawing to real world
         # 1/100 scale means: 1 unit on drawing = 100 units in reality
-        # If drawing is in cm: 1 cm on paper = 100 cm = 1 m in reality
-        
-        # Inches per meter on the drawing at given scale
-        # For 1/100: 1m reality = 1cm on drawing = 0.3937 inches
-        inches_per_meter_on_drawing = (100 / scale) * 0.3937
-        
-        # Pixels per meter
-        pixels_per_meter = inches_per_meter_on_drawing * px_per_inch
+        pixels_per_meter = _PX_PER_M_PER_SCALE / scale
         
         # Convert to requested unit
         if unit == "feet":
-            pixels_per_meter = pixels_per_meter / 0.3048
+            pixels_per_meter = pixels_per_meter / _FT_PER_M
         
         return pixels_per_meter
     
-    async def _convert_measurements(self, elements: Dict) -> Dict:
+    def _convert_measurements(self, elements: Dict) -> Dict:
         """تحويل جميع القياسات من بكسل إلى وحدات حقيقية"""
         converted = {}
-        
-        # Convert rooms
-        converted["rooms"] = []
-        for room in elements.get("rooms", []):
-            converted_room = room.copy()
-            converted_room["area"] = self._px_to_unit_area(room["area"])
-            converted_room["perimeter"] = self._px_to_unit(room["perimeter"])
-            converted["rooms"].append(converted_room)
-        
-        # Convert corridors
-        converted["corridors"] = []
-        for corridor in elements.get("corridors", []):
-            converted_corridor = corridor.copy()
-            converted_corridor["area"] = self._px_to_unit_area(corridor["area"])
-            converted_corridor["width"] = self._px_to_unit(corridor["width"])
-            converted_corridor["length"] = self._px_to_unit(corridor["length"])
-            converted["corridors"].append(converted_corridor)
-        
-        # Convert doors
-        converted["doors"] = []
-        for door in elements.get("doors", []):
-            converted_door = door.copy()
-            converted_door["width"] = self._px_to_unit(door["width"])
-            converted["doors"].append(converted_door)
-        
-        # Convert walls
-        converted["walls"] = []
-        for wall in elements.get("walls", []):
-            converted_wall = wall.copy()
-            converted_wall["length"] = self._px_to_unit(wall["length"])
-            converted_wall["thickness"] = self._px_to_unit(wall["thickness"])
-            converted["walls"].append(converted_wall)
+        inv_ppm = self._inv_ppm
+        inv_ppm2 = self._inv_ppm2
+        
+        # (category, [(field, factor), ...]) - each field is converted as one array
+        conversions = [
+            ("rooms", [("area", inv_ppm2), ("perimeter", inv_ppm)]),
+            ("corridors", [("area", inv_ppm2), ("width", inv_ppm), ("length", inv_ppm)]),
+            ("doors", [("width", inv_ppm)]),
+            ("walls", [("length", inv_ppm), ("thickness", inv_ppm)]),
+        ]
+        
+        for category, fields in conversions:
+            items = elements.get(category, [])
+            names = [name for name, _ in fields]
+            columns = [(self._column(items, name) * factor).tolist() for name, factor in fields]
+            
+            # Pre-sized output; each converted dict is built in one copy + update
+            out = [None] * len(items)
+            for i, (item, *values) in enumerate(zip(items, *columns)):
+                row = item.copy()
+                row.update(zip(names, values))
+                out[i] = row
+            
+            converted[category] = out
         
         # Keep other elements as is
         converted["windows"] = elements.get("windows", [])
@@ -168,30 +157,40 @@ class AreaAnalyzer:
         
         return converted
     
+    @staticmethod
+    def _column(items: List[Dict], field: str) -> np.ndarray:
+        """استخراج حقل رقمي من قائمة عناصر كمصفوفة"""
+        return np.fromiter(
+            (item[field] for item in items),
+            dtype=np.float64,
+            count=len(items)
+        )
+    
     def _px_to_unit(self, pixels: float) -> float:
         """تحويل من بكسل إلى وحدة قياس"""
-        if self.pixels_per_meter is None:
-            return pixels
-        return pixels / self.pixels_per_meter
+        return pixels * self._inv_ppm
     
     def _px_to_unit_area(self, pixels_squared: float) -> float:
         """تحويل مساحة من بكسل² إلى وحدة²"""
-        if self.pixels_per_meter is None:
-            return pixels_squared
-        return pixels_squared / (self.pixels_per_meter ** 2)
+        return pixels_squared * self._inv_ppm2
     
-    async def _calculate_metrics(self, elements: Dict) -> Dict[str, Any]:
+    def _calculate_metrics(self, elements: Dict) -> Dict[str, Any]:
         """حساب المقاييس الإجمالية"""
         rooms = elements.get("rooms", [])
         corridors = elements.get("corridors", [])
         
-        # Total room area (excluding corridors)
-        room_areas = [r["area"] for r in rooms if r not in corridors]
-        total_room_area = sum(room_areas) if room_areas else 0
+        # Total room area (excluding corridors) - identity set avoids deep dict comparisons
+        corridor_ids = {id(c) for c in corridors}
+        room_areas = np.fromiter(
+            (r["area"] for r in rooms if id(r) not in corridor_ids),
+            dtype=np.float64
+        )
+        total_room_area = float(room_areas.sum()) if room_areas.size else 0.0
+        avg_room_area = total_room_area / room_areas.size if room_areas.size else 0.0
         
         # Total corridor area
-        corridor_areas = [c["area"] for c in corridors]
-        total_corridor_area = sum(corridor_areas) if corridor_areas else 0
+        corridor_areas = self._column(corridors, "area")
+        total_corridor_area = float(corridor_areas.sum()) if corridor_areas.size else 0.0
         
         # GFA (Gross Floor Area) - all enclosed spaces
         gfa = total_room_area + total_corridor_area
@@ -218,7 +217,7 @@ class AreaAnalyzer:
             "circulation_ratio": round(circulation_ratio, 3),
             "total_rooms": len(rooms) - len(corridors),
             "total_corridors": len(corridors),
-            "avg_room_area": round(np.mean(room_areas), 2) if room_areas else 0,
+            "avg_room_area": round(avg_room_area, 2),
             "total_room_area": round(total_room_area, 2),
             "total_corridor_area": round(total_corridor_area, 2)
         }
@@ -2,6 +2,8 @@
 Metrics Calculator - حاسبة المقاييس
 حساب مقاييس الأداء والكفاءة
 """
+import math
+import numpy as np
 from typing import Dict, Any
 from loguru import logger
 
@@ -9,7 +11,7 @@ from loguru import logger
 class MetricsCalculator:
     """حاسبة المقاييس"""
     
-    async def calculate(
+    def calculate(
         self,
         areas: Dict[str, Any],
         elements: Dict[str, Any]
@@ -32,9 +34,9 @@ class MetricsCalculator:
             # Add additional calculations
             metrics = {
                 **base_metrics,
-                "density_metrics": await self._calculate_density(areas, elements),
-                "connectivity_metrics": await self._calculate_connectivity(elements),
-                "distribution_metrics": await self._calculate_distribution(areas)
+                "density_metrics": self._calculate_density(areas, elements),
+                "connectivity_metrics": self._calculate_connectivity(elements),
+                "distribution_metrics": self._calculate_distribution(areas)
             }
             
             return metrics
@@ -43,7 +45,7 @@ class MetricsCalculator:
             logger.error(f"❌ Error calculating metrics: {str(e)}")
             raise
     
-    async def _calculate_density(
+    def _calculate_density(
         self,
         areas: Dict,
         elements: Dict
@@ -57,7 +59,7 @@ class MetricsCalculator:
             "walls_per_100m2": len(elements.get("walls", [])) / gfa * 100 if gfa > 0 else 0
         }
     
-    async def _calculate_connectivity(self, elements: Dict) -> Dict[str, Any]:
+    def _calculate_connectivity(self, elements: Dict) -> Dict[str, Any]:
         """حساب معدلات الاتصال"""
         num_rooms = len(elements.get("rooms", []))
         num_doors = len(elements.get("doors", []))
@@ -67,19 +69,24 @@ class MetricsCalculator:
             "connectivity_index": num_doors / (num_rooms + 1) if num_rooms > 0 else 0
         }
     
-    async def _calculate_distribution(self, areas: Dict) -> Dict[str, Any]:
+    def _calculate_distribution(self, areas: Dict) -> Dict[str, Any]:
         """حساب توزيع المساحات"""
         rooms = areas.get("elements", {}).get("rooms", [])
         
         if not rooms:
             return {}
         
-        room_areas = [r["area"] for r in rooms]
+        room_areas = np.fromiter(
+            (r["area"] for r in rooms),
+            dtype=np.float64,
+            count=len(rooms)
+        )
         
-        import numpy as np
+        # Variance computed once; std derived from it instead of a second pass
+        variance = float(room_areas.var())
         
         return {
-            "area_std_dev": float(np.std(room_areas)),
-            "area_variance": float(np.var(room_areas)),
-            "area_range": float(max(room_areas) - min(room_areas))
+            "area_std_dev": math.sqrt(variance),
+            "area_variance": variance,
+            "area_range": float(np.ptp(room_areas))
         }
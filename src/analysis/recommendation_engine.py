@@ -14,9 +14,10 @@ Categories:
 """
 
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Final
 import logging
-from dataclasses import dataclass
+import operator
+from dataclasses import dataclass, field
 from enum import Enum
 
 logging.basicConfig(level=logging.INFO)
@@ -38,7 +39,20 @@ class RecommendationPriority(Enum):
     LOW = "low"  # WES impact < 2 points
 
 
-@dataclass
+# Sort rank per priority (definition order: critical first)
+_PRIORITY_RANK = {p: i for i, p in enumerate(RecommendationPriority)}
+
+
+# Fetches all exported fields of a Recommendation in one call
+_EXPORT_FIELDS = operator.attrgetter(
+    'priority', 'category', 'title_ar', 'title_en', 'description_ar',
+    'description_en', 'issue', 'estimated_wes_impact', 'estimated_cost',
+    'implementation_difficulty', 'implementation_time',
+    'affected_locations', 'supporting_evidence'
+)
+
+
+@dataclass(slots=True)
 class Recommendation:
     """Structured recommendation"""
     priority: RecommendationPriority
@@ -54,6 +68,122 @@ class Recommendation:
     implementation_time: str  # "Days", "Weeks", "Months"
     affected_locations: List[str]
     supporting_evidence: Dict[str, Any]
+    priority_val: str = field(init=False, repr=False, compare=False)
+    category_val: str = field(init=False, repr=False, compare=False)
+    _export: Dict[str, Any] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.priority_val = self.priority.value
+        self.category_val = self.category.value
+        
+        # Build the export form once, at construction
+        (priority, category, title_ar, title_en, description_ar,
+         description_en, issue, impact, cost, difficulty, time,
+         locations, evidence) = _EXPORT_FIELDS(self)
+        self._export = {
+            'priority': self.priority_val,
+            'category': self.category_val,
+            'title': {
+                'ar': title_ar,
+                'en': title_en
+            },
+            'description': {
+                'ar': description_ar,
+                'en': description_en
+            },
+            'issue': issue,
+            'estimated_wes_impact': impact,
+            'estimated_cost': cost,
+            'implementation_difficulty': difficulty,
+            'implementation_time': time,
+            'affected_locations': locations,
+            'supporting_evidence': evidence
+        }
+    
+    @classmethod
+    def from_template(
+        cls,
+        template: Tuple,
+        description_ar: str,
+        description_en: str,
+        issue: str,
+        estimated_wes_impact: float,
+        affected_locations: List[str],
+        supporting_evidence: Dict[str, Any],
+        title_args: Tuple = ()
+    ) -> "Recommendation":
+        """Build a recommendation from a static template plus its dynamic fields"""
+        priority, category, title_ar, title_en, cost, difficulty, time = template
+        if title_args:
+            title_ar = title_ar.format(*title_args)
+            title_en = title_en.format(*title_args)
+        return cls(
+            priority, category, title_ar, title_en, description_ar,
+            description_en, issue, estimated_wes_impact, cost, difficulty,
+            time, affected_locations, supporting_evidence
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready representation of the recommendation"""
+        return self._export
+
+
+# Shared cost / difficulty / time labels
+_COST_LOW: Final = "Low"
+_COST_LOW_MED: Final = "Low-Medium"
+_COST_MED: Final = "Medium"
+_COST_HIGH: Final = "High"
+_DIFF_EASY: Final = "Easy"
+_DIFF_MODERATE: Final = "Moderate"
+_DIFF_DIFFICULT: Final = "Difficult"
+_TIME_DAYS: Final = "Days"
+_TIME_DAYS_WEEKS: Final = "Days-Weeks"
+_TIME_WEEKS: Final = "Weeks"
+_TIME_MONTHS: Final = "Months"
+
+# Static fields of each recommendation kind:
+# (priority, category, title_ar, title_en, cost, difficulty, time).
+# Titles may contain {} placeholders filled from ``title_args``.
+_TPL_BOTTLENECKS = (
+    RecommendationPriority.HIGH, RecommendationCategory.STRUCTURAL,
+    "معالجة الاختناقات المرورية", "Address Traffic Bottlenecks",
+    _COST_HIGH, _DIFF_DIFFICULT, _TIME_MONTHS
+)
+_TPL_INTEGRATION = (
+    RecommendationPriority.MEDIUM, RecommendationCategory.STRUCTURAL,
+    "تحسين التكامل المكاني", "Improve Spatial Integration",
+    _COST_HIGH, _DIFF_DIFFICULT, _TIME_MONTHS
+)
+_TPL_BLIND_SPOTS = (
+    RecommendationPriority.HIGH, RecommendationCategory.STRUCTURAL,
+    "إزالة النقاط العمياء", "Remove Blind Spots",
+    _COST_MED, _DIFF_MODERATE, _TIME_WEEKS
+)
+_TPL_ROUTE_ERRORS = (
+    RecommendationPriority.CRITICAL, RecommendationCategory.QUICK_WIN,
+    "تقليل الأخطاء في مسار: {}", "Reduce Errors on Route: {}",
+    _COST_LOW, _DIFF_EASY, _TIME_DAYS
+)
+_TPL_FIRST_PASS = (
+    RecommendationPriority.HIGH, RecommendationCategory.SIGNAGE,
+    "تحسين نجاح المرور الأول: {}", "Improve First-Pass Success: {}",
+    _COST_LOW_MED, _DIFF_EASY, _TIME_DAYS_WEEKS
+)
+_TPL_SIGNAGE_COVERAGE = (
+    RecommendationPriority.CRITICAL, RecommendationCategory.QUICK_WIN,
+    "زيادة تغطية اللافتات", "Increase Signage Coverage",
+    _COST_LOW, _DIFF_EASY, _TIME_DAYS
+)
+_TPL_READABILITY = (
+    RecommendationPriority.HIGH, RecommendationCategory.QUICK_WIN,
+    "تحسين وضوح اللافتات", "Improve Signage Readability",
+    _COST_LOW, _DIFF_EASY, _TIME_DAYS
+)
+_TPL_WES_ERRORS = (
+    RecommendationPriority.CRITICAL, RecommendationCategory.SIGNAGE,
+    "معالجة الأخطاء الملاحية - أولوية قصوى", "Address Navigation Errors - Top Priority",
+    _COST_LOW, _DIFF_EASY, _TIME_DAYS
+)
 
 
 class RecommendationEngine:
@@ -67,7 +197,7 @@ class RecommendationEngine:
         """Initialize recommendation engine"""
         self.recommendations = []
     
-    async def generate_recommendations(
+    def generate_recommendations(
         self,
         space_syntax_results: Dict[str, Any],
         vga_results: Dict[str, Any],
@@ -85,55 +215,65 @@ class RecommendationEngine:
         self.recommendations = []
         
         # Analyze each component
-        await self._analyze_space_syntax(space_syntax_results, wes_results)
-        await self._analyze_vga(vga_results, wes_results)
-        await self._analyze_agent_simulation(agent_simulation_results, wes_results)
-        await self._analyze_signage(signage_results, wes_results)
-        await self._analyze_wes_priorities(wes_results)
+        self._analyze_space_syntax(space_syntax_results, wes_results)
+        self._analyze_vga(vga_results, wes_results)
+        self._analyze_agent_simulation(agent_simulation_results, wes_results)
+        self._analyze_signage(signage_results, wes_results)
+        self._analyze_wes_priorities(wes_results)
+        
+        # Nothing tripped a threshold - skip sorting and categorization
+        if not self.recommendations:
+            logger.info("Generated 0 recommendations")
+            categorized = {
+                key: [] for key in ('critical', 'high', 'medium', 'low', 'quick_wins', 'structural')
+            }
+            categorized['all'] = self.recommendations
+            return categorized
         
         # Sort by priority and impact
-        self.recommendations.sort(
-            key=lambda r: (
-                ['critical', 'high', 'medium', 'low'].index(r.priority.value),
-                -r.estimated_wes_impact
+        if len(self.recommendations) > 1:
+            self.recommendations.sort(
+                key=lambda r: (
+                    _PRIORITY_RANK[r.priority],
+                    -r.estimated_wes_impact
+                )
             )
-        )
         
-        # Categorize
+        # Categorize in a single pass
         categorized = {
-            'critical': [r for r in self.recommendations if r.priority == RecommendationPriority.CRITICAL],
-            'high': [r for r in self.recommendations if r.priority == RecommendationPriority.HIGH],
-            'medium': [r for r in self.recommendations if r.priority == RecommendationPriority.MEDIUM],
-            'low': [r for r in self.recommendations if r.priority == RecommendationPriority.LOW],
-            'quick_wins': [r for r in self.recommendations if r.category == RecommendationCategory.QUICK_WIN],
-            'structural': [r for r in self.recommendations if r.category == RecommendationCategory.STRUCTURAL],
-            'all': self.recommendations
+            'critical': [],
+            'high': [],
+            'medium': [],
+            'low': [],
+            'quick_wins': [],
+            'structural': []
         }
+        for r in self.recommendations:
+            categorized[r.priority_val].append(r)
+            if r.category is RecommendationCategory.QUICK_WIN:
+                categorized['quick_wins'].append(r)
+            elif r.category is RecommendationCategory.STRUCTURAL:
+                categorized['structural'].append(r)
+        categorized['all'] = self.recommendations
         
-        logger.info(f"Generated {len(self.recommendations)} recommendations")
+        logger.info("Generated %d recommendations", len(self.recommendations))
         return categorized
     
-    async def _analyze_space_syntax(self, results: Dict, wes_results: Dict):
+    def _analyze_space_syntax(self, results: Dict, wes_results: Dict):
         """Generate recommendations from Space Syntax analysis"""
         # Check bottlenecks
         critical_nodes = results.get('critical_nodes', {})
         bottlenecks = critical_nodes.get('bottlenecks', [])
         
         if len(bottlenecks) > 3:
-            self.recommendations.append(Recommendation(
-                priority=RecommendationPriority.HIGH,
-                category=RecommendationCategory.STRUCTURAL,
-                title_ar="معالجة الاختناقات المرورية",
-                title_en="Address Traffic Bottlenecks",
-                description_ar=f"تم تحديد {len(bottlenecks)} نقطة اختناق رئيسية. توسيع الممرات أو إضافة مسارات بديلة.",
-                description_en=f"Identified {len(bottlenecks)} major bottleneck points. Widen corridors or add alternative routes.",
-                issue=f"High betweenness at {len(bottlenecks)} nodes causing congestion",
-                estimated_wes_impact=8.5,
-                estimated_cost="High",
-                implementation_difficulty="Difficult",
-                implementation_time="Months",
-                affected_locations=bottlenecks[:5],
-                supporting_evidence={"betweenness_nodes": bottlenecks}
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_BOTTLENECKS,
+                f"تم تحديد {len(bottlenecks)} نقطة اختناق رئيسية. توسيع الممرات أو إضافة مسارات بديلة.",
+                f"Identified {len(bottlenecks)} major bottleneck points. Widen corridors or add alternative routes.",
+                f"High betweenness at {len(bottlenecks)} nodes causing congestion",
+                8.5,
+                bottlenecks[:5],
+                {"betweenness_nodes": bottlenecks}
             ))
         
         # Check integration
@@ -141,23 +281,17 @@ class RecommendationEngine:
         mean_integration = integration.get('mean_integration', 0.5)
         
         if mean_integration < 0.6:
-            self.recommendations.append(Recommendation(
-                priority=RecommendationPriority.MEDIUM,
-                category=RecommendationCategory.STRUCTURAL,
-                title_ar="تحسين التكامل المكاني",
-                title_en="Improve Spatial Integration",
-                description_ar="التصميم يظهر عمقاً مكانياً عالياً. إضافة ممرات اتصال أو اختصارات.",
-                description_en="Design shows high spatial depth. Add connecting corridors or shortcuts.",
-                issue=f"Low mean integration ({mean_integration:.2f})",
-                estimated_wes_impact=6.0,
-                estimated_cost="High",
-                implementation_difficulty="Difficult",
-                implementation_time="Months",
-                affected_locations=[],
-                supporting_evidence={"mean_integration": mean_integration}
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_INTEGRATION,
+                "التصميم يظهر عمقاً مكانياً عالياً. إضافة ممرات اتصال أو اختصارات.",
+                "Design shows high spatial depth. Add connecting corridors or shortcuts.",
+                f"Low mean integration ({mean_integration:.2f})",
+                6.0,
+                [],
+                {"mean_integration": mean_integration}
             ))
     
-    async def _analyze_vga(self, results: Dict, wes_results: Dict):
+    def _analyze_vga(self, results: Dict, wes_results: Dict):
         """Generate recommendations from VGA analysis"""
         summary = results.get('summary_statistics', {})
         blind_spot_pct = summary.get('blind_spot_percentage', 0)
@@ -166,88 +300,80 @@ class RecommendationEngine:
             critical_points = results.get('critical_points', {})
             blind_spots = critical_points.get('blind_spots', [])
             
-            self.recommendations.append(Recommendation(
-                priority=RecommendationPriority.HIGH,
-                category=RecommendationCategory.STRUCTURAL,
-                title_ar="إزالة النقاط العمياء",
-                title_en="Remove Blind Spots",
-                description_ar=f"{blind_spot_pct:.0f}% من المساحة تعاني من رؤية منخفضة. إزالة عوائق أو إضافة نوافذ.",
-                description_en=f"{blind_spot_pct:.0f}% of space has low visibility. Remove obstructions or add windows.",
-                issue=f"High blind spot percentage ({blind_spot_pct:.0f}%)",
-                estimated_wes_impact=7.5,
-                estimated_cost="Medium",
-                implementation_difficulty="Moderate",
-                implementation_time="Weeks",
-                affected_locations=blind_spots[:5],
-                supporting_evidence={"blind_spot_percentage": blind_spot_pct}
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_BLIND_SPOTS,
+                f"{blind_spot_pct:.0f}% من المساحة تعاني من رؤية منخفضة. إزالة عوائق أو إضافة نوافذ.",
+                f"{blind_spot_pct:.0f}% of space has low visibility. Remove obstructions or add windows.",
+                f"High blind spot percentage ({blind_spot_pct:.0f}%)",
+                7.5,
+                blind_spots[:5],
+                {"blind_spot_percentage": blind_spot_pct}
             ))
     
-    async def _analyze_agent_simulation(self, results: Dict, wes_results: Dict):
+    def _analyze_agent_simulation(self, results: Dict, wes_results: Dict):
         """Generate recommendations from agent simulation"""
         scenarios = results.get('scenarios', {})
+        if not scenarios:
+            return
         
-        for scenario_name, scenario_data in scenarios.items():
-            metrics = scenario_data.get('aggregate_metrics', {})
-            
-            # High error rate
-            mean_errors = metrics.get('mean_errors', 0)
-            if mean_errors > 2.0:
-                self.recommendations.append(Recommendation(
-                    priority=RecommendationPriority.CRITICAL,
-                    category=RecommendationCategory.QUICK_WIN,
-                    title_ar=f"تقليل الأخطاء في مسار: {scenario_name}",
-                    title_en=f"Reduce Errors on Route: {scenario_name}",
-                    description_ar=f"معدل خطأ عالي ({mean_errors:.1f}). إضافة لافتات توجيهية في نقاط القرار.",
-                    description_en=f"High error rate ({mean_errors:.1f}). Add directional signage at decision points.",
-                    issue=f"Mean errors: {mean_errors:.1f}",
-                    estimated_wes_impact=12.0,
-                    estimated_cost="Low",
-                    implementation_difficulty="Easy",
-                    implementation_time="Days",
-                    affected_locations=[scenario_name],
-                    supporting_evidence={"mean_errors": mean_errors, "scenario": scenario_name}
-                ))
-            
-            # Low first-pass success
-            first_pass = metrics.get('first_pass_success_rate', 1.0)
-            if first_pass < 0.6:
-                self.recommendations.append(Recommendation(
-                    priority=RecommendationPriority.HIGH,
-                    category=RecommendationCategory.SIGNAGE,
-                    title_ar=f"تحسين نجاح المرور الأول: {scenario_name}",
-                    title_en=f"Improve First-Pass Success: {scenario_name}",
-                    description_ar=f"فقط {first_pass*100:.0f}% يصلون بدون أخطاء. تحسين اللافتات والمعالم.",
-                    description_en=f"Only {first_pass*100:.0f}% reach without errors. Improve signage and landmarks.",
-                    issue=f"First-pass success: {first_pass*100:.0f}%",
-                    estimated_wes_impact=9.0,
-                    estimated_cost="Low-Medium",
-                    implementation_difficulty="Easy",
-                    implementation_time="Days-Weeks",
-                    affected_locations=[scenario_name],
-                    supporting_evidence={"first_pass_success": first_pass, "scenario": scenario_name}
-                ))
+        names = list(scenarios.keys())
+        metrics = [scenarios[name].get('aggregate_metrics', {}) for name in names]
+        mean_errors = np.fromiter(
+            (m.get('mean_errors', 0) for m in metrics),
+            dtype=np.float64,
+            count=len(names)
+        )
+        first_pass = np.fromiter(
+            (m.get('first_pass_success_rate', 1.0) for m in metrics),
+            dtype=np.float64,
+            count=len(names)
+        )
+        
+        # High error rate
+        for i in np.flatnonzero(mean_errors > 2.0):
+            scenario_name = names[i]
+            errors = float(mean_errors[i])
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_ROUTE_ERRORS,
+                f"معدل خطأ عالي ({errors:.1f}). إضافة لافتات توجيهية في نقاط القرار.",
+                f"High error rate ({errors:.1f}). Add directional signage at decision points.",
+                f"Mean errors: {errors:.1f}",
+                12.0,
+                [scenario_name],
+                {"mean_errors": errors, "scenario": scenario_name},
+                title_args=(scenario_name,)
+            ))
+        
+        # Low first-pass success
+        for i in np.flatnonzero(first_pass < 0.6):
+            scenario_name = names[i]
+            success = float(first_pass[i])
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_FIRST_PASS,
+                f"فقط {success*100:.0f}% يصلون بدون أخطاء. تحسين اللافتات والمعالم.",
+                f"Only {success*100:.0f}% reach without errors. Improve signage and landmarks.",
+                f"First-pass success: {success*100:.0f}%",
+                9.0,
+                [scenario_name],
+                {"first_pass_success": success, "scenario": scenario_name},
+                title_args=(scenario_name,)
+            ))
     
-    async def _analyze_signage(self, results: Dict, wes_results: Dict):
+    def _analyze_signage(self, results: Dict, wes_results: Dict):
         """Generate recommendations from signage analysis"""
         coverage = results.get('coverage', {})
         coverage_pct = coverage.get('coverage_percentage', 0)
         
         if coverage_pct < 80:
             uncovered = coverage.get('uncovered_points', [])
-            self.recommendations.append(Recommendation(
-                priority=RecommendationPriority.CRITICAL,
-                category=RecommendationCategory.QUICK_WIN,
-                title_ar="زيادة تغطية اللافتات",
-                title_en="Increase Signage Coverage",
-                description_ar=f"فقط {coverage_pct:.0f}% من نقاط القرار بها لافتات. إضافة لافتات في النقاط المفقودة.",
-                description_en=f"Only {coverage_pct:.0f}% of decision points have signage. Add signs at missing points.",
-                issue=f"Coverage: {coverage_pct:.0f}%",
-                estimated_wes_impact=15.0,
-                estimated_cost="Low",
-                implementation_difficulty="Easy",
-                implementation_time="Days",
-                affected_locations=uncovered[:5],
-                supporting_evidence={"coverage_percentage": coverage_pct, "uncovered_points": uncovered}
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_SIGNAGE_COVERAGE,
+                f"فقط {coverage_pct:.0f}% من نقاط القرار بها لافتات. إضافة لافتات في النقاط المفقودة.",
+                f"Only {coverage_pct:.0f}% of decision points have signage. Add signs at missing points.",
+                f"Coverage: {coverage_pct:.0f}%",
+                15.0,
+                uncovered[:5],
+                {"coverage_percentage": coverage_pct, "uncovered_points": uncovered}
             ))
         
         # Readability issues
@@ -255,23 +381,17 @@ class RecommendationEngine:
         readability_score = readability.get('readability_score', 1.0)
         
         if readability_score < 0.7:
-            self.recommendations.append(Recommendation(
-                priority=RecommendationPriority.HIGH,
-                category=RecommendationCategory.QUICK_WIN,
-                title_ar="تحسين وضوح اللافتات",
-                title_en="Improve Signage Readability",
-                description_ar="اللافتات تعاني من ضعف الوضوح. زيادة حجم الخط، التباين، والإضاءة.",
-                description_en="Signs have poor readability. Increase font size, contrast, and lighting.",
-                issue=f"Readability score: {readability_score*100:.0f}%",
-                estimated_wes_impact=10.0,
-                estimated_cost="Low",
-                implementation_difficulty="Easy",
-                implementation_time="Days",
-                affected_locations=[],
-                supporting_evidence={"readability_score": readability_score}
+            self.recommendations.append(Recommendation.from_template(
+                _TPL_READABILITY,
+                "اللافتات تعاني من ضعف الوضوح. زيادة حجم الخط، التباين، والإضاءة.",
+                "Signs have poor readability. Increase font size, contrast, and lighting.",
+                f"Readability score: {readability_score*100:.0f}%",
+                10.0,
+                [],
+                {"readability_score": readability_score}
             ))
     
-    async def _analyze_wes_priorities(self, wes_results: Dict):
+    def _analyze_wes_priorities(self, wes_results: Dict):
         """Generate recommendations from WES improvement priorities"""
         priorities = wes_results.get('improvement_priorities', [])
         
@@ -280,43 +400,16 @@ class RecommendationEngine:
             impact = priority['impact_on_wes']
             
             if metric == 'errors' and priority['priority'] == 'HIGH':
-                self.recommendations.append(Recommendation(
-                    priority=RecommendationPriority.CRITICAL,
-                    category=RecommendationCategory.SIGNAGE,
-                    title_ar="معالجة الأخطاء الملاحية - أولوية قصوى",
-                    title_en="Address Navigation Errors - Top Priority",
-                    description_ar=f"الأخطاء الملاحية لها أعلى تأثير على WES (+{impact:.1f} نقطة إذا تحسنت).",
-                    description_en=f"Navigation errors have highest WES impact (+{impact:.1f} points if improved).",
-                    issue=f"Errors metric needs improvement",
-                    estimated_wes_impact=impact,
-                    estimated_cost="Low",
-                    implementation_difficulty="Easy",
-                    implementation_time="Days",
-                    affected_locations=[],
-                    supporting_evidence=priority
+                self.recommendations.append(Recommendation.from_template(
+                    _TPL_WES_ERRORS,
+                    f"الأخطاء الملاحية لها أعلى تأثير على WES (+{impact:.1f} نقطة إذا تحسنت).",
+                    f"Navigation errors have highest WES impact (+{impact:.1f} points if improved).",
+                    "Errors metric needs improvement",
+                    impact,
+                    [],
+                    priority
                 ))
     
     def format_recommendations_for_export(self) -> List[Dict[str, Any]]:
         """Format recommendations for JSON export"""
-        formatted = []
-        for rec in self.recommendations:
-            formatted.append({
-                'priority': rec.priority.value,
-                'category': rec.category.value,
-                'title': {
-                    'ar': rec.title_ar,
-                    'en': rec.title_en
-                },
-                'description': {
-                    'ar': rec.description_ar,
-                    'en': rec.description_en
-                },
-                'issue': rec.issue,
-                'estimated_wes_impact': rec.estimated_wes_impact,
-                'estimated_cost': rec.estimated_cost,
-                'implementation_difficulty': rec.implementation_difficulty,
-                'implementation_time': rec.implementation_time,
-                'affected_locations': rec.affected_locations,
-                'supporting_evidence': rec.supporting_evidence
-            })
-        return formatted
+        return [rec.to_dict() for rec in self.recommendations]
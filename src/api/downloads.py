@@ -0,0 +1,142 @@
+"""
+Download Handling - تنزيل الملفات
+إرسال الملفات الناتجة مع دعم طلبات النطاق (HTTP Range) وضغط نتائج JSON
+"""
+import asyncio
+import gzip
+import os
+import re
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from src.api.uploads import CHUNK_SIZE
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Payloads smaller than this aren't worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    تحليل ترويسة Range لنطاق واحد
+
+    Returns:
+        (start, end) شاملاً، أو None لإرسال الملف كاملاً
+        (multi-range and malformed headers fall back to the full file)
+    """
+    match = _RANGE_RE.fullmatch(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the final N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="النطاق المطلوب غير متاح",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _iter_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """قراءة جزء من الملف على دفعات"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: str
+) -> Response:
+    """
+    استجابة ملف تدعم Range حتى يتمكن العارض من التنقل دون تنزيل كامل
+
+    Full-file requests go through FileResponse, which lets the server use
+    its zero-copy path when available.
+    """
+    size = os.stat(path).st_size
+    byte_range = None
+    if "range" in request.headers:
+        byte_range = _parse_range(request.headers["range"], size)
+
+    if byte_range is None:
+        return FileResponse(
+            path,
+            media_type=media_type,
+            filename=filename,
+            headers={"Accept-Ranges": "bytes"}
+        )
+
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+    )
+
+
+def _accepts_gzip(header: str) -> bool:
+    """
+    هل تقبل ترويسة Accept-Encoding ترميز gzip
+
+    An explicit "gzip" entry decides; otherwise "*" does. A q-value of 0
+    (or an unparsable one) refuses the coding.
+    """
+    qvalues = {}
+    for token in header.lower().split(","):
+        coding, _, params = token.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.strip()] = q
+
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+
+async def json_bytes_response(request: Request, raw: bytes) -> Response:
+    """
+    استجابة JSON جاهزة (بايتات) مضغوطة بـ gzip إذا قبلها العميل
+
+    Compression is applied per endpoint rather than through GZipMiddleware,
+    which would buffer the Server-Sent Events stream.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if len(raw) >= GZIP_MIN_SIZE and _accepts_gzip(request.headers.get("accept-encoding", "")):
+        raw = await asyncio.to_thread(gzip.compress, raw, 5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=raw, media_type="application/json", headers=headers)
@@ -0,0 +1,50 @@
+"""
+Job Events - بث تقدم المهام
+Server-Sent Events بدلاً من الاستطلاع المتكرر لحالة المهمة
+"""
+from contextlib import aclosing
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from src.database.job_store import job_store, encode_json
+
+router = APIRouter()
+
+FINAL_STATUSES = ("completed", "failed", "deleted")
+
+# ثوانٍ بلا تحديثات قبل إرسال keep-alive وإعادة التحقق من وجود المهمة
+KEEPALIVE_INTERVAL = 15.0
+
+
+@router.get("/api/events/{job_id}")
+async def job_events(job_id: str):
+    """
+    بث تحديثات المهمة (text/event-stream)
+    
+    The first event is the current job state; the stream closes once the
+    job completes, fails or is deleted, or when it expires while idle.
+    """
+    if not await job_store.exists(job_id):
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    
+    async def stream():
+        updates = job_store.listen(job_id, idle_timeout=KEEPALIVE_INTERVAL)
+        # aclosing: unsubscribe as soon as the stream ends, not at GC
+        async with aclosing(updates):
+            async for update in updates:
+                if update is None:
+                    if not await job_store.exists(job_id):
+                        break
+                    yield b": keep-alive\n\n"
+                    continue
+                
+                yield b"data: " + encode_json(update) + b"\n\n"
+                if update.get("status") in FINAL_STATUSES:
+                    break
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
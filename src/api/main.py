@@ -1,19 +1,31 @@
 """
 FastAPI Main Application - التطبيق الرئيسي
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from typing import Optional, Dict, Any
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
+import asyncio
 import uuid
+import aiofiles.os
+import numpy as np
+import orjson
 from pathlib import Path
-import shutil
+from arq import create_pool
+from arq.connections import RedisSettings
 from loguru import logger
 
 from src.config import settings, ensure_directories
+from src.database.job_store import job_store, job_etag, encode_json
+from src.api.uploads import save_upload, configure_upload_spooling
+from src.api.downloads import ranged_file_response, json_bytes_response
+from src.api.events import router as events_router
 from src.parser.image_processor import ImageProcessor
-from src.detection.element_detector import ElementDetector
+from src.detection.element_detector import ElementDetector, rescale_elements
 from src.analysis.metrics_calculator import MetricsCalculator
 from src.analysis.area_analyzer import AreaAnalyzer
 from src.wayfinding.pathfinder import PathFinder
@@ -36,13 +48,33 @@ from src.wayfinding.wes_calculator import WESCalculator
 from src.visualization.heatmap_generator import HeatmapGenerator
 from src.analysis.recommendation_engine import RecommendationEngine
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """تهيئة الموارد عند البدء وتنظيفها عند الإيقاف"""
+    logger.info("🚀 Starting Floor Plan Analyzer API...")
+    logger.info(f"Environment: {settings.fpa_env}")
+    logger.info(f"API Host: {settings.api_host}:{settings.api_port}")
+    configure_upload_spooling()
+    await job_store.connect()
+    app.state.arq = await create_pool(RedisSettings.from_dsn(settings.redis_url))
+    
+    yield
+    
+    logger.info("🛑 Shutting down Floor Plan Analyzer API...")
+    await app.state.arq.close()
+    await job_store.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Floor Plan Analyzer API",
     description="محلل مخططات الطوابق - نظام متكامل لتحليل المخططات المعمارية",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -50,30 +82,16 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=settings.allowed_methods,
+    allow_headers=settings.allowed_headers,
 )
 
+# Progress push (SSE)
+app.include_router(events_router)
+
 # Ensure directories exist
 ensure_directories()
 
-# Jobs storage (in production, use Redis/Database)
-jobs_storage: Dict[str, Dict[str, Any]] = {}
-
-
-@app.on_event("startup")
-async def startup_event():
-    """تهيئة التطبيق عند البدء"""
-    logger.info("🚀 Starting Floor Plan Analyzer API...")
-    logger.info(f"Environment: {settings.fpa_env}")
-    logger.info(f"API Host: {settings.api_host}:{settings.api_port}")
-    
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """تنظيف الموارد عند الإيقاف"""
-    logger.info("🛑 Shutting down Floor Plan Analyzer API...")
-
 
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -101,14 +119,15 @@ async def health_check():
     }
 
 
-@app.post("/api/analyze", response_model=AnalysisResponse)
+@app.post("/api/analyze", response_model=AnalysisResponse, status_code=202)
 async def analyze_floor_plan(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
     scale: Optional[float] = None,
     unit: Optional[str] = "meters",
     building_type: Optional[str] = "hospital",
-    enable_color_analysis: Optional[bool] = True,
-    background_tasks: BackgroundTasks = None
+    enable_color_analysis: Optional[bool] = True
 ):
     """
     تحليل مخطط طابق
@@ -137,13 +156,40 @@ async def analyze_floor_plan(
         
         # Save uploaded file
         upload_path = settings.upload_dir / f"{job_id}_{file.filename}"
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        _, digest = await save_upload(file, upload_path)
         
         logger.info(f"📁 File uploaded: {job_id} - {file.filename}")
         
+        # Identical file + parameters → reuse the previous analysis
+        cache_key = f"fp:{digest}:{scale}:{unit}:{building_type}:{enable_color_analysis}"
+        cached = await job_store.get_cached_result(cache_key)
+        if cached is not None:
+            upload_path.unlink(missing_ok=True)
+            cached["job_id"] = job_id
+            cached["metadata"]["filename"] = file.filename
+            
+            await job_store.create(job_id, {
+                "status": "completed",
+                "filename": file.filename,
+                "upload_path": str(upload_path),
+                "cache_key": cache_key,
+                "progress": 100,
+                "message": "اكتمل التحليل بنجاح"
+            })
+            await job_store.set_result(job_id, cached)
+            
+            logger.info(f"♻️ Reused cached analysis for {job_id}")
+            response.status_code = 200
+            response.headers["Location"] = f"/api/status/{job_id}"
+            return {
+                "job_id": job_id,
+                "status": "completed",
+                "message": "تم استخدام نتيجة تحليل سابقة لنفس الملف",
+                "estimated_time": "0"
+            }
+        
         # Initialize job status
-        jobs_storage[job_id] = {
+        await job_store.create(job_id, {
             "status": "processing",
             "filename": file.filename,
             "upload_path": str(upload_path),
@@ -151,21 +197,26 @@ async def analyze_floor_plan(
             "unit": unit,
             "building_type": building_type,
             "enable_color_analysis": enable_color_analysis,
+            "cache_key": cache_key,
             "progress": 0,
             "message": "جاري المعالجة..."
-        }
+        })
         
-        # Start background processing
-        background_tasks.add_task(
-            process_floor_plan,
+        # Hand off to the analysis workers
+        await request.app.state.arq.enqueue_job(
+            "process_floor_plan_task",
             job_id,
-            upload_path,
+            str(upload_path),
             scale,
             unit,
             building_type,
-            enable_color_analysis
+            enable_color_analysis,
+            cache_key
         )
         
+        # 202 Accepted: poll the status URL (or subscribe to /api/events)
+        response.headers["Location"] = f"/api/status/{job_id}"
+        response.headers["Retry-After"] = "2"
         return {
             "job_id": job_id,
             "status": "processing",
@@ -178,8 +229,10 @@ async def analyze_floor_plan(
         raise HTTPException(status_code=500, detail=f"خطأ في معالجة الملف: {str(e)}")
 
 
-@app.get("/api/status/{job_id}", response_model=JobStatus)
-async def get_job_status(job_id: str):
+# Polled endpoint: JobStatus documents the schema only - the body is
+# encoded directly instead of being validated through the model
+@app.get("/api/status/{job_id}", responses={200: {"model": JobStatus}})
+async def get_job_status(job_id: str, request: Request):
     """
     الحصول على حالة المهمة
     
@@ -187,23 +240,36 @@ async def get_job_status(job_id: str):
         job_id: معرف المهمة
     
     Returns:
-        حالة المهمة وتقدم المعالجة
+        حالة المهمة وتقدم المعالجة (304 إذا لم تتغير منذ آخر طلب)
     """
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    job = jobs_storage[job_id]
-    return {
+    etag = job_etag(job)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    result = None
+    if job["status"] == "completed":
+        # Embed the stored JSON as-is rather than decoding and re-encoding it
+        raw = await job_store.get_result_json(job_id)
+        if raw is not None:
+            result = orjson.Fragment(raw)
+    
+    content = encode_json({
         "job_id": job_id,
         "status": job["status"],
         "progress": job.get("progress", 0),
         "message": job.get("message", ""),
-        "result": job.get("result")
-    }
+        "result": result
+    })
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @app.get("/api/report/{job_id}")
-async def get_report(job_id: str, format: str = "json"):
+async def get_report(job_id: str, request: Request, format: str = "json"):
     """
     الحصول على التقرير النهائي
     
@@ -214,22 +280,24 @@ async def get_report(job_id: str, format: str = "json"):
     Returns:
         التقرير بالصيغة المطلوبة
     """
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    job = jobs_storage[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="التحليل لم يكتمل بعد")
     
     if format == "json":
-        return JSONResponse(content=job.get("result", {}))
+        # Stored payload is already JSON - pass it through without re-encoding
+        raw = await job_store.get_result_json(job_id)
+        return await json_bytes_response(request, raw or b"{}")
     
     elif format == "pdf":
         # Generate PDF report
         pdf_path = settings.output_dir / f"{job_id}_report.pdf"
         if pdf_path.exists():
-            return FileResponse(
+            return ranged_file_response(
+                request,
                 pdf_path,
                 media_type="application/pdf",
                 filename=f"floor_plan_report_{job_id}.pdf"
@@ -244,22 +312,26 @@ async def get_report(job_id: str, format: str = "json"):
 @app.delete("/api/jobs/{job_id}")
 async def delete_job(job_id: str):
     """حذف مهمة ومخرجاتها"""
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    job = jobs_storage[job_id]
-    
-    # Delete files
+    # Delete files (the upload plus every output registered for this job),
+    # then the job's output directories, which are registered as well
     try:
-        upload_path = Path(job["upload_path"])
-        if upload_path.exists():
-            upload_path.unlink()
+        outputs = await job_store.get_outputs(job_id)
+        is_dir = await asyncio.gather(*(aiofiles.os.path.isdir(path) for path in outputs))
+        directories = [path for path, d in zip(outputs, is_dir) if d]
+        files = [path for path, d in zip(outputs, is_dir) if not d]
+        if job.get("upload_path"):
+            files.append(job["upload_path"])
         
-        output_path = settings.output_dir / f"{job_id}_*"
-        for file in settings.output_dir.glob(f"{job_id}_*"):
-            file.unlink()
+        await asyncio.gather(*(_remove_file(path) for path in files))
+        await asyncio.gather(*(_remove_dir(path) for path in directories))
         
-        del jobs_storage[job_id]
+        # A cached copy of the result is dropped too: deleting a job should
+        # not leave its analysis being served to later identical uploads
+        await job_store.delete(job_id, cache_key=job.get("cache_key"))
         
         return {"message": "تم حذف المهمة بنجاح"}
     
@@ -267,71 +339,154 @@ async def delete_job(job_id: str):
         raise HTTPException(status_code=500, detail=f"خطأ في حذف المهمة: {str(e)}")
 
 
+async def _remove_file(path: str):
+    """حذف ملف إن وُجد"""
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _remove_dir(path: str):
+    """حذف مجلد فارغ (يُترك إن احتوى ملفات غير مسجلة)"""
+    try:
+        await aiofiles.os.rmdir(path)
+    except OSError:
+        pass
+
+
+# Stateless pipeline components - built once per process and reused by every job
+image_processor = ImageProcessor()
+element_detector = ElementDetector()
+metrics_calculator = MetricsCalculator()
+visibility_analyzer = VisibilityAnalyzer()
+color_extractor = ColorExtractor()
+
+
+@lru_cache(maxsize=None)
+def get_code_checker(building_type: str) -> CodeChecker:
+    """فاحص الكود لنوع المبنى (واحد لكل نوع)"""
+    return CodeChecker(building_type)
+
+
+def _processed_image_path(file_path: str) -> Path:
+    """مسار الصورة المعالجة بجوار الملف المرفوع"""
+    path = Path(file_path)
+    return path.with_name(f"{path.name}.processed.npy")
+
+
+def _process_and_detect(file_path: str) -> Tuple[Dict[str, Any], float, str]:
+    """
+    معالجة الصورة واكتشاف العناصر
+    
+    Runs inside a CPU worker process. Only paths and the detected elements
+    cross the process boundary: the processed uint8 image is written next
+    to the upload instead of being pickled back to the parent.
+    
+    Returns:
+        (العناصر بدقة الصورة المعالجة، معامل التصغير، مسار الصورة المعالجة)
+    """
+    async def run():
+        processed_image, factor = await image_processor.process(Path(file_path))
+        
+        # Large plans are analyzed downscaled; detection thresholds follow
+        # the working resolution
+        detector = element_detector if factor == 1.0 else ElementDetector(pixel_scale=factor)
+        return processed_image, factor, await detector.detect(processed_image)
+    
+    processed_image, factor, elements = asyncio.run(run())
+    image_path = _processed_image_path(file_path)
+    np.save(image_path, processed_image)
+    return elements, factor, str(image_path)
+
+
+def _load_processed_image(image_path: str) -> np.ndarray:
+    """تحميل الصورة المعالجة التي كتبها العامل ثم حذفها"""
+    try:
+        return np.load(image_path)
+    finally:
+        Path(image_path).unlink(missing_ok=True)
+
+
 async def process_floor_plan(
     job_id: str,
     file_path: Path,
     scale: Optional[float],
     unit: str,
     building_type: str,
-    enable_color_analysis: bool
+    enable_color_analysis: bool,
+    executor: Optional[Executor] = None,
+    cache_key: Optional[str] = None
 ):
     """
     معالجة مخطط الطابق (خلفية)
+    
+    Args:
+        executor: مجمع العمليات لمعالجة الصورة واكتشاف العناصر
+                  (None = مجمع الخيوط الافتراضي)
+        cache_key: مفتاح محتوى المدخلات لحفظ النتيجة وإعادة استخدامها
     """
     try:
         logger.info(f"🔄 Processing job {job_id}...")
+        job = await job_store.get(job_id)
         
         # Update progress: Parsing
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 10,
             "message": "تحليل الصورة واستخراج العناصر..."
         })
         
-        # 1. Image Processing
-        processor = ImageProcessor()
-        processed_image = await processor.process(file_path)
-        
-        # 2. Element Detection
-        jobs_storage[job_id].update({
+        # 1-2. Image Processing & Element Detection (CPU-bound, off the event loop)
+        await job_store.update(job_id, {
             "progress": 30,
             "message": "اكتشاف الأبواب والجدران والغرف..."
         })
         
-        detector = ElementDetector()
-        elements = await detector.detect(processed_image)
+        loop = asyncio.get_running_loop()
+        working_elements, factor, image_path = await loop.run_in_executor(
+            executor, _process_and_detect, str(file_path)
+        )
+        
+        # The image stays at the working resolution for the image-based
+        # stages (VGA, heatmaps, color). Element geometry is mapped back to
+        # the original pixel grid, which the element-based analyses and the
+        # response are expressed in.
+        processed_image = await asyncio.to_thread(_load_processed_image, image_path)
+        if factor == 1.0:
+            elements = working_elements
+        else:
+            elements = rescale_elements(working_elements, 1 / factor)
         
         # 3. Area Analysis
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 50,
             "message": "حساب المساحات والمقاييس..."
         })
         
         area_analyzer = AreaAnalyzer()
-        areas = await area_analyzer.analyze(elements, scale, unit)
+        areas = area_analyzer.analyze(elements, scale, unit)
         
         # 4. Metrics Calculation
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 60,
             "message": "حساب مؤشرات الأداء..."
         })
         
-        metrics_calc = MetricsCalculator()
-        metrics = await metrics_calc.calculate(areas, elements)
+        metrics = metrics_calculator.calculate(areas, elements)
         
         # 5. Basic Wayfinding Analysis
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 50,
             "message": "تحليل التوجيه والمسارات الأساسي..."
         })
         
         pathfinder = PathFinder()
-        wayfinding = await pathfinder.analyze(elements, areas)
+        wayfinding = pathfinder.analyze(elements, areas)
         
-        visibility = VisibilityAnalyzer()
-        visibility_data = await visibility.analyze(elements)
+        visibility_data = await visibility_analyzer.analyze(elements)
         
         # 6. Advanced Space Syntax Analysis
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 55,
             "message": "تحليل Space Syntax (Hillier)..."
         })
@@ -349,7 +504,7 @@ async def process_floor_plan(
             logger.warning(f"⚠️ Space Syntax analysis failed: {str(e)}")
         
         # 7. VGA & Isovists Analysis
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 62,
             "message": "تحليل VGA و Isovists (Benedikt/Turner)..."
         })
@@ -359,15 +514,15 @@ async def process_floor_plan(
             vga_analyzer = VGAAnalyzer()
             vga_results = await vga_analyzer.analyze(
                 floor_plan_image=processed_image,
-                walls=elements.get('walls', []),
-                scale_px_per_meter=scale if scale else 50.0
+                walls=working_elements.get('walls', []),
+                scale_px_per_meter=(scale if scale else 50.0) * factor
             )
             logger.info("✅ VGA & Isovists analysis completed")
         except Exception as e:
             logger.warning(f"⚠️ VGA analysis failed: {str(e)}")
         
         # 8. Signage Analysis
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 68,
             "message": "تحليل اللافتات والإرشادات..."
         })
@@ -390,7 +545,7 @@ async def process_floor_plan(
             logger.warning(f"⚠️ Signage analysis failed: {str(e)}")
         
         # 9. Agent-Based Simulation
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 74,
             "message": "محاكاة عوامل التنقل (Agent Simulation)..."
         })
@@ -417,16 +572,17 @@ async def process_floor_plan(
             simulation_results = await agent_simulator.simulate(
                 graph=wayfinding.graph if hasattr(wayfinding, 'graph') else None,
                 scenarios=scenarios,
-                signage_nodes=signage_nodes,
-                landmark_nodes=landmark_nodes,
-                n_agents_per_scenario=50  # Reduced for performance
+                n_agents_per_scenario=50,  # Reduced for performance
+                signage_locations=signage_nodes,
+                landmarks=landmark_nodes,
+                executor=executor
             )
             logger.info("✅ Agent simulation completed")
         except Exception as e:
             logger.warning(f"⚠️ Agent simulation failed: {str(e)}")
         
         # 10. WES Score Calculation
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 80,
             "message": "حساب درجة كفاءة Wayfinding (WES)..."
         })
@@ -445,7 +601,7 @@ async def process_floor_plan(
             logger.warning(f"⚠️ WES calculation failed: {str(e)}")
         
         # 11. Heatmap Generation
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 85,
             "message": "توليد الخرائط الحرارية..."
         })
@@ -460,12 +616,15 @@ async def process_floor_plan(
                 simulation_results=simulation_results,
                 output_dir=settings.output_dir / job_id
             )
+            await job_store.add_outputs(
+                job_id, *heatmaps.values(), str(settings.output_dir / job_id)
+            )
             logger.info("✅ Heatmaps generated")
         except Exception as e:
             logger.warning(f"⚠️ Heatmap generation failed: {str(e)}")
         
         # 12. Recommendations Generation
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 90,
             "message": "توليد التوصيات المبنية على البحث العلمي..."
         })
@@ -473,7 +632,7 @@ async def process_floor_plan(
         recommendations = None
         try:
             rec_engine = RecommendationEngine()
-            recommendations = await rec_engine.generate_recommendations(
+            recommendations = rec_engine.generate_recommendations(
                 space_syntax_results=space_syntax_results,
                 vga_results=vga_results,
                 signage_results=signage_results,
@@ -485,33 +644,35 @@ async def process_floor_plan(
             logger.warning(f"⚠️ Recommendation generation failed: {str(e)}")
         
         # 13. Compliance Check
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 93,
             "message": "فحص الامتثال للكود..."
         })
         
-        checker = CodeChecker(building_type)
+        checker = get_code_checker(building_type)
         compliance = await checker.check(elements, areas, metrics)
         
         # 14. Color Analysis (if enabled)
         color_data = None
         if enable_color_analysis:
-            jobs_storage[job_id].update({
+            await job_store.update(job_id, {
                 "progress": 96,
                 "message": "تحليل الألوان..."
             })
             
-            color_extractor = ColorExtractor()
             color_data = await color_extractor.extract(processed_image)
         
         # Compile comprehensive results
         result = {
             "job_id": job_id,
             "metadata": {
-                "filename": jobs_storage[job_id]["filename"],
+                "filename": job["filename"],
                 "scale": scale,
                 "unit": unit,
                 "building_type": building_type,
+                # VGA points and heatmaps use the working image grid:
+                # original pixel = working pixel / image_scale
+                "image_scale": factor,
                 "analysis_version": "2.0.0-academic"
             },
             "elements": elements,
@@ -535,18 +696,22 @@ async def process_floor_plan(
         }
         
         # Update job status
-        jobs_storage[job_id].update({
+        # Heatmap images live under this job's output directory and are
+        # deleted with it, so only heatmap-free results are cached
+        if heatmaps:
+            cache_key = None
+        await job_store.set_result(job_id, result, cache_key=cache_key)
+        await job_store.update(job_id, {
             "status": "completed",
             "progress": 100,
-            "message": "اكتمل التحليل بنجاح",
-            "result": result
+            "message": "اكتمل التحليل بنجاح"
         })
         
         logger.info(f"✅ Job {job_id} completed successfully")
         
     except Exception as e:
         logger.error(f"❌ Error processing job {job_id}: {str(e)}")
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "status": "failed",
             "progress": 0,
             "message": f"خطأ في المعالجة: {str(e)}"
@@ -560,5 +725,9 @@ if __name__ == "__main__":
         host=settings.api_host,
         port=settings.api_port,
         workers=settings.api_workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.api_backlog,
+        limit_concurrency=settings.api_limit_concurrency,
         reload=False
     )
@@ -11,25 +11,46 @@ Implements comprehensive wayfinding analysis based on:
 For hospital wayfinding optimization
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from concurrent.futures import Executor
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, Any, List
 import uuid
-import json
+import hashlib
+import orjson
 from pathlib import Path
-import shutil
+from arq import create_pool
+from arq.connections import RedisSettings
 from loguru import logger
 import asyncio
 
-# Import academic analysis modules
-from src.wayfinding.space_syntax import SpaceSyntaxAnalyzer
-from src.wayfinding.vga_isovists import VisibilityAnalyzer
-from src.wayfinding.agent_simulation import AgentSimulator, AgentType
-from src.wayfinding.signage_analyzer import SignageAnalyzer, SignageElement, Landmark, SignageType
-from src.wayfinding.wes_calculator import WESCalculator, WESWeights
-from src.visualization.heatmap_generator import HeatmapGenerator
-from src.analysis.recommendation_engine import RecommendationEngine
+from src.config import settings
+from src.database.job_store import job_store, job_etag
+from src.api.uploads import save_upload, configure_upload_spooling
+from src.api.downloads import json_bytes_response
+from src.api.events import router as events_router
+
+# Academic analysis modules (cv2, networkx, shapely, matplotlib) are
+# imported inside the functions that run them, so the API processes
+# never load them - only the analysis workers do.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """تهيئة التطبيق"""
+    logger.info("🚀 Starting Academic Wayfinding Analysis API...")
+    logger.info("📚 Modules: Space Syntax, VGA, Agent Simulation, Signage, WES")
+    configure_upload_spooling()
+    await job_store.connect()
+    app.state.arq = await create_pool(RedisSettings.from_dsn(settings.redis_url))
+    
+    yield
+    
+    await app.state.arq.close()
+    await job_store.close()
+
 
 # Configuration
 app = FastAPI(
@@ -37,28 +58,22 @@ app = FastAPI(
     description="نظام متقدم لتحليل التوجيه الأكاديمي في المستشفيات",
     version="2.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=settings.allowed_methods,
+    allow_headers=settings.allowed_headers,
 )
 
-# Storage
-jobs_storage: Dict[str, Dict[str, Any]] = {}
-
-
-@app.on_event("startup")
-async def startup_event():
-    """تهيئة التطبيق"""
-    logger.info("🚀 Starting Academic Wayfinding Analysis API...")
-    logger.info("📚 Modules: Space Syntax, VGA, Agent Simulation, Signage, WES")
-
+# Progress push (SSE)
+app.include_router(events_router)
 
 @app.get("/")
 async def root():
@@ -88,14 +103,15 @@ async def health_check():
     }
 
 
-@app.post("/api/analyze/wayfinding")
+@app.post("/api/analyze/wayfinding", status_code=202)
 async def analyze_wayfinding(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
     scale: float = 100.0,  # pixels per meter
     scenarios: Optional[str] = None,  # JSON string of scenarios
     n_agents: int = 100,
-    enable_heatmaps: bool = True,
-    background_tasks: BackgroundTasks = None
+    enable_heatmaps: bool = True
 ):
     """
     تحليل شامل للتوجيه (Wayfinding)
@@ -114,18 +130,17 @@ async def analyze_wayfinding(
         # Generate job ID
         job_id = str(uuid.uuid4())
         
-        # Save file
-        upload_path = Path(f"./uploads/{job_id}_{file.filename}")
+        # Save file (shared volume - read back by the analysis workers)
+        upload_path = settings.upload_dir / f"{job_id}_{file.filename}"
         upload_path.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        _, digest = await save_upload(file, upload_path)
         
         logger.info(f"📁 Uploaded: {job_id}")
         
         # Parse scenarios
         if scenarios:
-            scenarios_data = json.loads(scenarios)
+            scenarios_data = orjson.loads(scenarios)
         else:
             # Default hospital scenarios
             scenarios_data = [
@@ -134,25 +149,66 @@ async def analyze_wayfinding(
                 {"name": "entrance_to_pharmacy", "start": "entrance", "destination": "pharmacy"}
             ]
         
+        # Identical file + parameters → reuse the previous analysis.
+        # Heatmap images live under the job's own output directory, so
+        # only heatmap-free runs are cached.
+        cache_key = None
+        if not enable_heatmaps:
+            scenarios_digest = hashlib.blake2b(
+                orjson.dumps(scenarios_data, option=orjson.OPT_SORT_KEYS),
+                digest_size=16
+            ).hexdigest()
+            cache_key = f"wf:{digest}:{scale}:{scenarios_digest}:{n_agents}"
+            
+            cached = await job_store.get_cached_result(cache_key)
+            if cached is not None:
+                upload_path.unlink(missing_ok=True)
+                cached["job_id"] = job_id
+                cached["metadata"]["filename"] = file.filename
+                
+                await job_store.create(job_id, {
+                    "status": "completed",
+                    "filename": file.filename,
+                    "cache_key": cache_key,
+                    "progress": 100,
+                    "message": "اكتمل التحليل الأكاديمي بنجاح ✅"
+                })
+                await job_store.set_result(job_id, cached)
+                
+                logger.info(f"♻️ Reused cached analysis for {job_id}")
+                response.status_code = 200
+                response.headers["Location"] = f"/api/status/{job_id}"
+                return {
+                    "job_id": job_id,
+                    "status": "completed",
+                    "message": "تم استخدام نتيجة تحليل سابقة لنفس الملف",
+                    "estimated_time": "0"
+                }
+        
         # Initialize job
-        jobs_storage[job_id] = {
+        await job_store.create(job_id, {
             "status": "processing",
             "filename": file.filename,
+            "cache_key": cache_key,
             "progress": 0,
             "message": "بدء التحليل الأكاديمي..."
-        }
+        })
         
-        # Start processing
-        background_tasks.add_task(
-            process_academic_analysis,
+        # Hand off to the analysis workers
+        await request.app.state.arq.enqueue_job(
+            "process_academic_analysis_task",
             job_id,
-            upload_path,
+            str(upload_path),
             scale,
             scenarios_data,
             n_agents,
-            enable_heatmaps
+            enable_heatmaps,
+            cache_key
         )
         
+        # 202 Accepted: poll the status URL (or subscribe to /api/events)
+        response.headers["Location"] = f"/api/status/{job_id}"
+        response.headers["Retry-After"] = "2"
         return {
             "job_id": job_id,
             "status": "processing",
@@ -166,26 +222,34 @@ async def analyze_wayfinding(
 
 
 @app.get("/api/status/{job_id}")
-async def get_status(job_id: str):
-    """الحصول على حالة المهمة"""
-    if job_id not in jobs_storage:
+async def get_status(job_id: str, request: Request, response: Response):
+    """الحصول على حالة المهمة (304 إذا لم تتغير منذ آخر طلب)"""
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    return jobs_storage[job_id]
+    etag = job_etag(job)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
+    return job
 
 
 @app.get("/api/results/{job_id}")
-async def get_results(job_id: str):
+async def get_results(job_id: str, request: Request):
     """الحصول على النتائج الكاملة"""
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    job = jobs_storage[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="التحليل لم يكتمل")
     
-    return JSONResponse(content=job.get("result", {}))
+    # Stored payload is already JSON - pass it through without re-encoding
+    raw = await job_store.get_result_json(job_id)
+    return await json_bytes_response(request, raw or b"{}")
 
 
 @app.get("/api/heatmap/{job_id}/{heatmap_type}")
@@ -195,10 +259,10 @@ async def get_heatmap(job_id: str, heatmap_type: str):
     
     Types: betweenness, integration, vga, errors
     """
-    if job_id not in jobs_storage:
+    if not await job_store.exists(job_id):
         raise HTTPException(status_code=404, detail="المهمة غير موجودة")
     
-    heatmap_path = Path(f"./heatmaps/{job_id}/{heatmap_type}_heatmap.png")
+    heatmap_path = settings.output_dir / "heatmaps" / job_id / f"{heatmap_type}_heatmap.png"
     
     if not heatmap_path.exists():
         raise HTTPException(status_code=404, detail="الخريطة الحرارية غير متوفرة")
@@ -206,22 +270,77 @@ async def get_heatmap(job_id: str, heatmap_type: str):
     return FileResponse(heatmap_path, media_type="image/png")
 
 
+def _run_space_syntax(graph: "nx.Graph") -> Dict[str, Any]:
+    """تحليل Space Syntax (runs inside a CPU worker process)"""
+    from src.wayfinding.space_syntax import SpaceSyntaxAnalyzer
+    return asyncio.run(SpaceSyntaxAnalyzer().analyze(graph, weighted=True))
+
+
+def _run_vga(file_path: str, walls: List[Dict], scale: float) -> Dict[str, Any]:
+    """
+    تحليل VGA والـ Isovists
+    
+    Runs inside a CPU worker process; loads the image there so it is
+    never pickled across the process boundary.
+    """
+    import cv2
+    from src.wayfinding.vga_isovists import VisibilityAnalyzer
+    
+    floor_plan_img = cv2.imread(file_path)
+    return asyncio.run(VisibilityAnalyzer().analyze(floor_plan_img, walls, scale))
+
+
+def _run_heatmaps(
+    file_path: str,
+    scale: float,
+    ss_results: Dict,
+    vga_results: Dict,
+    simulation_results: Dict,
+    output_dir: str
+) -> Dict[str, str]:
+    """توليد الخرائط الحرارية (runs inside a CPU worker process)"""
+    import cv2
+    from src.visualization.heatmap_generator import HeatmapGenerator
+    
+    floor_plan_img = cv2.imread(file_path)
+    heatmap_gen = HeatmapGenerator(floor_plan_img, scale)
+    return asyncio.run(heatmap_gen.generate_all_heatmaps(
+        ss_results,
+        vga_results,
+        simulation_results,
+        output_dir
+    ))
+
+
 async def process_academic_analysis(
     job_id: str,
     file_path: Path,
     scale: float,
     scenarios: List[Dict],
     n_agents: int,
-    enable_heatmaps: bool
+    enable_heatmaps: bool,
+    cache_key: Optional[str] = None,
+    executor: Optional[Executor] = None
 ):
     """
     معالجة التحليل الأكاديمي الكامل
+    
+    Args:
+        cache_key: مفتاح محتوى المدخلات لحفظ النتيجة وإعادة استخدامها
+        executor: مجمع العمليات للمراحل الحسابية الثقيلة
+                  (None = مجمع الخيوط الافتراضي)
     """
+    from src.wayfinding.agent_simulation import AgentSimulator
+    from src.wayfinding.signage_analyzer import SignageAnalyzer
+    from src.wayfinding.wes_calculator import WESCalculator
+    from src.analysis.recommendation_engine import RecommendationEngine
+    
     try:
         logger.info(f"🔬 Starting academic analysis for job {job_id}")
+        job = await job_store.get(job_id)
         
         # ============= STEP 1: Image Processing & Graph Extraction =============
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 10,
             "message": "معالجة الصورة واستخراج الرسم البياني..."
         })
@@ -231,45 +350,36 @@ async def process_academic_analysis(
         import networkx as nx
         graph = await create_sample_hospital_graph()
         
-        # ============= STEP 2: Space Syntax Analysis =============
-        jobs_storage[job_id].update({
+        # ============= STEPS 2-3: Space Syntax + VGA & Isovists =============
+        # Independent of each other (graph vs. image), so they run side by
+        # side in the CPU pool while the signage sample data is prepared.
+        await job_store.update(job_id, {
             "progress": 20,
-            "message": "تحليل Space Syntax..."
-        })
-        
-        space_syntax = SpaceSyntaxAnalyzer(graph)
-        ss_results = await space_syntax.analyze(graph, weighted=True)
-        
-        logger.info(f"✅ Space Syntax complete")
-        
-        # ============= STEP 3: VGA & Isovists =============
-        jobs_storage[job_id].update({
-            "progress": 35,
-            "message": "حساب VGA والـ Isovists..."
+            "message": "تحليل Space Syntax و حساب VGA والـ Isovists..."
         })
         
-        # Load floor plan image
-        import cv2
-        floor_plan_img = cv2.imread(str(file_path))
-        
         # Extract walls (simplified)
         walls = []  # TODO: Extract from image
         
-        vga_analyzer = VisibilityAnalyzer(floor_plan_img, walls, scale)
-        vga_results = await vga_analyzer.analyze(floor_plan_img, walls, scale)
+        loop = asyncio.get_running_loop()
+        ss_results, vga_results, signage_elements, landmarks = await asyncio.gather(
+            loop.run_in_executor(executor, _run_space_syntax, graph),
+            loop.run_in_executor(executor, _run_vga, str(file_path), walls, scale),
+            create_sample_signage(),
+            create_sample_landmarks()
+        )
         
+        logger.info(f"✅ Space Syntax complete")
         logger.info(f"✅ VGA complete")
         
         # ============= STEP 4: Signage Analysis =============
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 50,
             "message": "تحليل اللافتات والمعالم..."
         })
         
         # Sample signage data
         decision_points = ["node_1", "node_2", "node_3"]
-        signage_elements = await create_sample_signage()
-        landmarks = await create_sample_landmarks()
         
         signage_analyzer = SignageAnalyzer(
             graph,
@@ -283,7 +393,7 @@ async def process_academic_analysis(
         logger.info(f"✅ Signage analysis complete")
         
         # ============= STEP 5: Agent-Based Simulation =============
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 65,
             "message": "محاكاة العملاء (Agent Simulation)..."
         })
@@ -291,55 +401,65 @@ async def process_academic_analysis(
         signage_nodes = [s.node_id for s in signage_elements]
         landmark_nodes = [l.node_id for l in landmarks]
         
-        agent_sim = AgentSimulator(graph, signage_nodes, landmark_nodes)
-        simulation_results = await agent_sim.simulate(graph, scenarios, n_agents_per_scenario=n_agents)
+        simulation_results = await AgentSimulator().simulate(
+            graph,
+            scenarios,
+            n_agents_per_scenario=n_agents,
+            signage_locations=signage_nodes,
+            landmarks=landmark_nodes,
+            executor=executor
+        )
         
         logger.info(f"✅ Agent simulation complete")
         
-        # ============= STEP 6: WES Calculation =============
-        jobs_storage[job_id].update({
+        # ============= STEPS 6-7: WES Calculation + Heatmaps =============
+        # Both only read the results above; heatmaps render in the CPU pool
+        # while WES is scored here.
+        await job_store.update(job_id, {
             "progress": 80,
-            "message": "حساب درجة WES..."
+            "message": "حساب درجة WES وإنشاء الخرائط الحرارية..."
+            if enable_heatmaps else "حساب درجة WES..."
         })
         
         wes_calc = WESCalculator()
-        wes_results = await wes_calc.calculate_wes(
+        wes_task = wes_calc.calculate_wes(
             ss_results,
             vga_results,
             simulation_results,
             signage_results
         )
         
-        logger.info(f"✅ WES Score: {wes_results['wes_score']:.1f}/100")
-        
-        # ============= STEP 7: Heatmaps =============
         if enable_heatmaps:
-            jobs_storage[job_id].update({
-                "progress": 90,
-                "message": "إنشاء الخرائط الحرارية..."
-            })
-            
-            heatmap_gen = HeatmapGenerator(floor_plan_img, scale)
-            output_dir = f"./heatmaps/{job_id}"
-            heatmaps = await heatmap_gen.generate_all_heatmaps(
-                ss_results,
-                vga_results,
-                simulation_results,
-                output_dir
+            output_dir = str(settings.output_dir / "heatmaps" / job_id)
+            wes_results, heatmaps = await asyncio.gather(
+                wes_task,
+                loop.run_in_executor(
+                    executor,
+                    _run_heatmaps,
+                    str(file_path),
+                    scale,
+                    ss_results,
+                    vga_results,
+                    simulation_results,
+                    output_dir
+                )
             )
-            
+            await job_store.add_outputs(job_id, *heatmaps.values(), output_dir)
             logger.info(f"✅ Heatmaps generated")
         else:
+            wes_results = await wes_task
             heatmaps = {}
         
+        logger.info(f"✅ WES Score: {wes_results['wes_score']:.1f}/100")
+        
         # ============= STEP 8: Recommendations =============
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "progress": 95,
             "message": "إنشاء التوصيات..."
         })
         
         rec_engine = RecommendationEngine()
-        recommendations = await rec_engine.generate_recommendations(
+        recommendations = rec_engine.generate_recommendations(
             ss_results,
             vga_results,
             simulation_results,
@@ -353,7 +473,7 @@ async def process_academic_analysis(
         result = {
             "job_id": job_id,
             "metadata": {
-                "filename": jobs_storage[job_id]["filename"],
+                "filename": job["filename"],
                 "scale": scale,
                 "scenarios": scenarios,
                 "n_agents": n_agents
@@ -376,11 +496,11 @@ async def process_academic_analysis(
         }
         
         # Update job
-        jobs_storage[job_id].update({
+        await job_store.set_result(job_id, result, cache_key=cache_key)
+        await job_store.update(job_id, {
             "status": "completed",
             "progress": 100,
-            "message": "اكتمل التحليل الأكاديمي بنجاح ✅",
-            "result": result
+            "message": "اكتمل التحليل الأكاديمي بنجاح ✅"
         })
         
         logger.info(f"✅ Job {job_id} completed successfully")
@@ -391,14 +511,14 @@ async def process_academic_analysis(
         import traceback
         traceback.print_exc()
         
-        jobs_storage[job_id].update({
+        await job_store.update(job_id, {
             "status": "failed",
             "progress": 0,
             "message": f"خطأ: {str(e)}"
         })
 
 
-async def create_sample_hospital_graph() -> nx.Graph:
+async def create_sample_hospital_graph() -> "nx.Graph":
     """Create sample hospital graph for testing"""
     import networkx as nx
     
@@ -430,8 +550,10 @@ async def create_sample_hospital_graph() -> nx.Graph:
     return G
 
 
-async def create_sample_signage() -> List[SignageElement]:
+async def create_sample_signage() -> List["SignageElement"]:
     """Create sample signage data"""
+    from src.wayfinding.signage_analyzer import SignageElement, SignageType
+    
     signage = [
         SignageElement(
             node_id="entrance",
@@ -461,8 +583,10 @@ async def create_sample_signage() -> List[SignageElement]:
     return signage
 
 
-async def create_sample_landmarks() -> List[Landmark]:
+async def create_sample_landmarks() -> List["Landmark"]:
     """Create sample landmarks"""
+    from src.wayfinding.signage_analyzer import Landmark
+    
     landmarks = [
         Landmark(
             node_id="node_1",
@@ -481,5 +605,9 @@ if __name__ == "__main__":
         "src.api.main_academic:app",
         host="0.0.0.0",
         port=8001,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.api_backlog,
+        limit_concurrency=settings.api_limit_concurrency,
         reload=True
     )
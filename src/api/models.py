@@ -1,6 +1,9 @@
 """
 Pydantic Models - نماذج البيانات
+Request/response envelopes are Pydantic models; internal value objects
+(points, boxes, element geometry, colors) are plain slotted dataclasses.
 """
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -39,13 +42,15 @@ class JobStatus(BaseModel):
     result: Optional[Dict[str, Any]] = None
 
 
-class Point(BaseModel):
+@dataclass(slots=True)
+class Point:
     """نقطة ثنائية الأبعاد"""
     x: float
     y: float
 
 
-class BoundingBox(BaseModel):
+@dataclass(slots=True)
+class BoundingBox:
     """صندوق محيط"""
     x_min: float
     y_min: float
@@ -67,7 +72,8 @@ class Room(BaseModel):
     floor_level: int = 0
 
 
-class Door(BaseModel):
+@dataclass(slots=True)
+class Door:
     """باب"""
     id: str
     width: float
@@ -77,7 +83,8 @@ class Door(BaseModel):
     to_room: Optional[str] = None
 
 
-class Window(BaseModel):
+@dataclass(slots=True)
+class Window:
     """نافذة"""
     id: str
     width: float
@@ -86,7 +93,8 @@ class Window(BaseModel):
     room_id: Optional[str] = None
 
 
-class Wall(BaseModel):
+@dataclass(slots=True)
+class Wall:
     """جدار"""
     id: str
     start: Point
@@ -104,7 +112,8 @@ class Corridor(BaseModel):
     polygon: List[Point]
 
 
-class Stair(BaseModel):
+@dataclass(slots=True)
+class Stair:
     """درج"""
     id: str
     location: Point
@@ -112,7 +121,8 @@ class Stair(BaseModel):
     type: str  # straight, spiral, L-shaped
 
 
-class Elevator(BaseModel):
+@dataclass(slots=True)
+class Elevator:
     """مصعد"""
     id: str
     location: Point
@@ -170,7 +180,8 @@ class ComplianceResult(BaseModel):
     severity: str  # critical, warning, info
 
 
-class ColorInfo(BaseModel):
+@dataclass(slots=True)
+class ColorInfo:
     """معلومات اللون"""
     rgb: List[int]
     hex: str
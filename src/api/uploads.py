@@ -0,0 +1,121 @@
+"""
+Upload Handling - حفظ الملفات المرفوعة
+نسخ الملف المرفوع إلى القرص على دفعات دون حجز حلقة الأحداث
+"""
+import asyncio
+import hashlib
+import os
+import queue
+from pathlib import Path
+from typing import Tuple
+
+import aiofiles
+from fastapi import UploadFile
+from loguru import logger
+from starlette.formparsers import MultiPartParser
+
+# Copy chunk size (1 MB)
+CHUNK_SIZE = 1 << 20
+
+# Upload staging buffer size (4 MB)
+BUFFER_SIZE = 4 << 20
+
+
+def configure_upload_spooling():
+    """
+    إبقاء الملفات المرفوعة حتى حجم BUFFER_SIZE في الذاكرة قبل نقلها إلى ملف مؤقت
+    
+    Starlette exposes the spool threshold only as a MultiPartParser class
+    attribute (max_file_size, renamed spool_max_size in 0.40), so this is
+    process-wide; it is called once from the app lifespan.
+    """
+    for attr in ("spool_max_size", "max_file_size"):
+        if hasattr(MultiPartParser, attr):
+            setattr(MultiPartParser, attr, BUFFER_SIZE)
+            return
+    logger.warning("⚠️ MultiPartParser has no spool size setting; using Starlette's default")
+
+
+class BufferPool:
+    """
+    مجمع مخازن مؤقتة قابلة لإعادة الاستخدام
+    
+    Recycles fixed-size bytearrays so large uploads don't allocate and
+    free multi-MB buffers per request. Buffers are created on demand and
+    at most max_buffers are kept; the pool never blocks.
+    """
+    
+    def __init__(self, buffer_size: int, max_buffers: int):
+        self.buffer_size = buffer_size
+        self._free: queue.LifoQueue = queue.LifoQueue(maxsize=max_buffers)
+    
+    def get(self) -> bytearray:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return bytearray(self.buffer_size)
+    
+    def put(self, buf: bytearray):
+        try:
+            self._free.put_nowait(buf)
+        except queue.Full:
+            pass
+
+
+buffer_pool = BufferPool(BUFFER_SIZE, max_buffers=8)
+
+
+def _sendfile(spooled, out_path: Path) -> Tuple[int, str]:
+    """نسخ داخل النواة (zero-copy) من ملف مؤقت إلى مسار، مع حساب البصمة"""
+    spooled.seek(0)
+    digest = hashlib.file_digest(spooled, "blake2b").hexdigest()
+    
+    in_fd = spooled.fileno()
+    size = os.fstat(in_fd).st_size
+    with open(out_path, "wb") as out:
+        out_fd = out.fileno()
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    return offset, digest
+
+
+async def save_upload(file: UploadFile, path: Path) -> Tuple[int, str]:
+    """
+    حفظ ملف مرفوع إلى القرص
+
+    Args:
+        file: الملف المرفوع
+        path: مسار الحفظ
+
+    Returns:
+        (عدد البايتات المكتوبة, بصمة BLAKE2b للمحتوى)
+    """
+    # Starlette spools uploads larger than BUFFER_SIZE to a real temp file
+    # (see configure_upload_spooling); hand its fd to the kernel instead of
+    # copying through user space. Smaller uploads may still be in memory,
+    # where fileno() would force them to disk.
+    spooled = file.file
+    if hasattr(os, "sendfile") and (file.size or 0) > BUFFER_SIZE:
+        return await asyncio.to_thread(_sendfile, spooled, path)
+
+    # Still in memory: copy through a pooled buffer. readinto() on the
+    # in-memory spool never blocks, so it's safe on the event loop.
+    written = 0
+    hasher = hashlib.blake2b()
+    buf = buffer_pool.get()
+    try:
+        spooled.seek(0)
+        async with aiofiles.open(path, "wb") as out:
+            with memoryview(buf) as view:
+                while n := spooled.readinto(buf):
+                    chunk = view[:n]
+                    hasher.update(chunk)
+                    await out.write(chunk)
+                    written += n
+    finally:
+        buffer_pool.put(buf)
+    return written, hasher.hexdigest()
@@ -2,19 +2,43 @@
 Color Extractor - مستخرج الألوان
 تحليل الألوان واستخراج لوحة الألوان السائدة
 """
+import asyncio
 import cv2
 import numpy as np
 from typing import List, Dict, Any
-from sklearn.cluster import KMeans
 from loguru import logger
-import colorsys
 
 from src.config import settings
 
 
+# Hue bands for the color distribution (OpenCV hue, 0-179; inclusive bounds,
+# as cv2.inRange counted them, so a boundary hue falls in both bands)
+_HUE_RANGES = {
+    "red": ((0, 10), (170, 180)),
+    "orange": ((10, 25),),
+    "yellow": ((25, 35),),
+    "green": ((35, 85),),
+    "cyan": ((85, 95),),
+    "blue": ((95, 135),),
+    "purple": ((135, 170),)
+}
+
+# Band membership per hue value: (n_bands, 180) lookup table
+_HUE_BAND_TABLE = np.zeros((len(_HUE_RANGES), 180))
+for _i, _ranges in enumerate(_HUE_RANGES.values()):
+    for _lo, _hi in _ranges:
+        _HUE_BAND_TABLE[_i, _lo:_hi + 1] = 1.0
+
+
 class ColorExtractor:
     """مستخرج الألوان"""
     
+    # Number of dominant colors reported
+    N_DOMINANT = 5
+    
+    # Longest image edge analyzed (color statistics are resolution-invariant)
+    MAX_EDGE = 1024
+    
     def __init__(self):
         self.palette_size = settings.color_palette_size
     
@@ -28,23 +52,42 @@ class ColorExtractor:
         Returns:
             تحليل شامل للألوان مع الرسوم البيانية
         """
+        # Pure NumPy/OpenCV work - run it off the event loop
+        return await asyncio.to_thread(self._extract_sync, image)
+    
+    def _extract_sync(self, image: np.ndarray) -> Dict[str, Any]:
+        """استخراج الألوان (متزامن)"""
         try:
             logger.info("🎨 Extracting colors and creating visualizations...")
             
-            # Extract dominant colors
-            dominant_colors = await self._extract_dominant_colors(image)
+            # Color-space conversions below expect BGR
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
             
-            # Create color palette
-            palette = await self._create_palette(image)
+            # Work on a thumbnail; hotspot coordinates are scaled back
+            scale = min(1.0, self.MAX_EDGE / max(image.shape[:2]))
+            if scale < 1.0:
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            
+            # One clustering serves both the palette and the dominant colors
+            palette = self._extract_dominant_colors(
+                image,
+                max(self.N_DOMINANT, self.palette_size)
+            )
+            dominant_colors = palette[:self.N_DOMINANT]
+            
+            # Color-space conversions shared by the passes below
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
             
             # Calculate color statistics
-            stats = await self._calculate_color_stats(image)
+            stats = self._calculate_color_stats(image, hsv, gray)
             
             # Create heatmap
-            heatmap_data = await self._create_heatmap(image)
+            heatmap_data = self._create_heatmap(gray, scale)
             
             # Analyze color distribution
-            distribution = await self._analyze_distribution(image)
+            distribution = self._analyze_distribution(hsv)
             
             result = {
                 "dominant_colors": dominant_colors,
@@ -52,7 +95,7 @@ class ColorExtractor:
                 "statistics": stats,
                 "heatmap": heatmap_data,
                 "distribution": distribution,
-                "recommendations": await self._generate_recommendations(dominant_colors, stats)
+                "recommendations": self._generate_recommendations(dominant_colors, stats)
             }
             
             return result
@@ -61,46 +104,60 @@ class ColorExtractor:
             logger.error(f"❌ Error extracting colors: {str(e)}")
             raise
     
-    async def _extract_dominant_colors(
+    def _extract_dominant_colors(
         self,
         image: np.ndarray,
         n_colors: int = 5
     ) -> List[Dict[str, Any]]:
         """استخراج الألوان السائدة باستخدام K-Means"""
         try:
-            # Reshape image to list of pixels
+            # Reshape image to list of pixels (stays uint8 until sampled)
             pixels = image.reshape(-1, 3)
             
-            # Remove black and white (borders/background)
-            mask = ~((pixels.sum(axis=1) < 30) | (pixels.sum(axis=1) > 725))
+            # Remove black and white (borders/background): every channel
+            # below 10 or above 245. Channel max/min reduce in uint8
+            # instead of widening to an int64 sum.
+            mask = ~((pixels.max(axis=1) < 10) | (pixels.min(axis=1) > 245))
             pixels = pixels[mask]
             
             if len(pixels) == 0:
                 return []
             
-            # Sample for performance (max 10000 pixels)
+            # Sample for performance (max 10000 pixels). Drawing with
+            # replacement avoids permuting all N indices; the seeded
+            # generator also makes the palette reproducible.
             if len(pixels) > 10000:
-                indices = np.random.choice(len(pixels), 10000, replace=False)
-                pixels = pixels[indices]
+                rng = np.random.default_rng(42)
+                pixels = pixels[rng.integers(0, len(pixels), 10000)]
             
-            # K-Means clustering
-            kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-            kmeans.fit(pixels)
+            # K-Means clustering (OpenCV's native implementation, k-means++
+            # seeding; float32 copies of the sampled pixels only)
+            samples = pixels.astype(np.float32)
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+            cv2.setRNGSeed(42)
+            _, labels, centers = cv2.kmeans(
+                samples,
+                min(n_colors, len(samples)),
+                None,
+                criteria,
+                3,
+                cv2.KMEANS_PP_CENTERS
+            )
+            labels = labels.ravel()
             
             # Get colors and their frequencies
-            colors = kmeans.cluster_centers_.astype(int)
-            labels = kmeans.labels_
+            colors = centers.astype(int)
             
-            # Calculate percentages
-            unique, counts = np.unique(labels, return_counts=True)
+            # Calculate percentages (bincount keeps empty clusters aligned)
+            counts = np.bincount(labels, minlength=len(colors))
             percentages = (counts / counts.sum() * 100).tolist()
             
             # Convert to result format
+            names = self._get_color_names(colors)
             dominant = []
-            for i, (color, pct) in enumerate(zip(colors, percentages)):
+            for i, (color, pct, color_name) in enumerate(zip(colors, percentages, names)):
                 b, g, r = color
                 hex_color = f"#{r:02x}{g:02x}{b:02x}"
-                color_name = await self._get_color_name(r, g, b)
                 
                 dominant.append({
                     "rgb": [int(r), int(g), int(b)],
@@ -119,40 +176,41 @@ class ColorExtractor:
             logger.warning(f"⚠️ Error extracting dominant colors: {str(e)}")
             return []
     
-    async def _create_palette(self, image: np.ndarray) -> List[Dict[str, Any]]:
-        """إنشاء لوحة ألوان شاملة"""
-        return await self._extract_dominant_colors(image, self.palette_size)
-    
-    async def _calculate_color_stats(self, image: np.ndarray) -> Dict[str, Any]:
+    def _calculate_color_stats(
+        self,
+        image: np.ndarray,
+        hsv: np.ndarray,
+        gray: np.ndarray
+    ) -> Dict[str, Any]:
         """حساب الإحصائيات اللونية"""
         try:
-            # Convert to different color spaces
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Single-pass SIMD reductions
+            gray_mean, gray_std = cv2.meanStdDev(gray)
+            gray_min, gray_max, _, _ = cv2.minMaxLoc(gray)
+            hsv_mean, hsv_std = cv2.meanStdDev(hsv)
             
             # Calculate statistics
             stats = {
                 # Brightness
-                "brightness_avg": float(np.mean(gray)),
-                "brightness_std": float(np.std(gray)),
-                "brightness_min": float(np.min(gray)),
-                "brightness_max": float(np.max(gray)),
+                "brightness_avg": float(gray_mean[0, 0]),
+                "brightness_std": float(gray_std[0, 0]),
+                "brightness_min": float(gray_min),
+                "brightness_max": float(gray_max),
                 
                 # Saturation
-                "saturation_avg": float(np.mean(hsv[:, :, 1])),
-                "saturation_std": float(np.std(hsv[:, :, 1])),
+                "saturation_avg": float(hsv_mean[1, 0]),
+                "saturation_std": float(hsv_std[1, 0]),
                 
                 # Hue
-                "hue_avg": float(np.mean(hsv[:, :, 0])),
-                "hue_std": float(np.std(hsv[:, :, 0])),
+                "hue_avg": float(hsv_mean[0, 0]),
+                "hue_std": float(hsv_std[0, 0]),
                 
                 # Contrast
-                "contrast_ratio": float(np.max(gray) / (np.min(gray) + 1)),
-                "contrast_std": float(np.std(gray)),
+                "contrast_ratio": float(gray_max / (gray_min + 1)),
+                "contrast_std": float(gray_std[0, 0]),
                 
                 # Color temperature (warm vs cool)
-                "temperature": await self._calculate_temperature(image)
+                "temperature": self._calculate_temperature(image)
             }
             
             return stats
@@ -161,11 +219,10 @@ class ColorExtractor:
             logger.warning(f"⚠️ Error calculating color stats: {str(e)}")
             return {}
     
-    async def _calculate_temperature(self, image: np.ndarray) -> str:
+    def _calculate_temperature(self, image: np.ndarray) -> str:
         """حساب درجة حرارة اللون (دافئ/بارد)"""
         # Calculate average red vs blue
-        avg_red = np.mean(image[:, :, 2])
-        avg_blue = np.mean(image[:, :, 0])
+        avg_blue, _, avg_red, _ = cv2.mean(image)
         
         if avg_red > avg_blue * 1.1:
             return "warm"
@@ -174,120 +231,130 @@ class ColorExtractor:
         else:
             return "neutral"
     
-    async def _create_heatmap(self, image: np.ndarray) -> Dict[str, Any]:
-        """إنشاء خريطة حرارية للكثافة اللونية"""
+    def _create_heatmap(self, gray: np.ndarray, scale: float = 1.0) -> Dict[str, Any]:
+        """
+        إنشاء خريطة حرارية للكثافة اللونية
+        
+        Args:
+            gray: الصورة الرمادية (قد تكون مصغرة)
+            scale: نسبة التصغير - لإرجاع مواقع النقاط الساخنة إلى أبعاد الصورة الأصلية
+        """
         try:
-            # Convert to grayscale for intensity
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Summed-area table: one pass, then any rectangle mean in O(1)
+            integral = cv2.integral(gray, sdepth=cv2.CV_64F)
             
-            # Create heatmap
-            heatmap = cv2.applyColorMap(gray, cv2.COLORMAP_JET)
+            def rect_mean(y0: int, y1: int, x0: int, x1: int) -> float:
+                total = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+                return float(total / ((y1 - y0) * (x1 - x0)))
             
             # Calculate zones
             h, w = gray.shape
             zones = {
-                "top_left": float(np.mean(gray[0:h//2, 0:w//2])),
-                "top_right": float(np.mean(gray[0:h//2, w//2:w])),
-                "bottom_left": float(np.mean(gray[h//2:h, 0:w//2])),
-                "bottom_right": float(np.mean(gray[h//2:h, w//2:w])),
-                "center": float(np.mean(gray[h//4:3*h//4, w//4:3*w//4]))
+                "top_left": rect_mean(0, h//2, 0, w//2),
+                "top_right": rect_mean(0, h//2, w//2, w),
+                "bottom_left": rect_mean(h//2, h, 0, w//2),
+                "bottom_right": rect_mean(h//2, h, w//2, w),
+                "center": rect_mean(h//4, 3*h//4, w//4, 3*w//4)
             }
             
             return {
                 "zones": zones,
-                "overall_intensity": float(np.mean(gray)),
-                "hotspots": await self._find_hotspots(gray)
+                "overall_intensity": rect_mean(0, h, 0, w),
+                "hotspots": self._find_hotspots(gray, scale=scale)
             }
             
         except Exception as e:
             logger.warning(f"⚠️ Error creating heatmap: {str(e)}")
             return {}
     
-    async def _find_hotspots(self, gray: np.ndarray, threshold: float = 200) -> List[Dict]:
-        """إيجاد النقاط الساخنة (المناطق عالية الكثافة)"""
+    def _find_hotspots(
+        self,
+        gray: np.ndarray,
+        threshold: float = 200,
+        scale: float = 1.0
+    ) -> List[Dict]:
+        """إيجاد النقاط الساخنة (المناطق عالية الكثافة) بإحداثيات الصورة الأصلية"""
         # Find bright regions
         _, thresh = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
         
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Areas and centroids of every region in a single pass
+        n_labels, _, stats, centroids = cv2.connectedComponentsWithStats(thresh, connectivity=8)
         
-        hotspots = []
-        for contour in contours[:10]:  # Top 10
-            M = cv2.moments(contour)
-            if M["m00"] > 0:
-                cx = M["m10"] / M["m00"]
-                cy = M["m01"] / M["m00"]
-                area = cv2.contourArea(contour)
-                
-                hotspots.append({
-                    "location": {"x": float(cx), "y": float(cy)},
-                    "area": float(area)
-                })
+        # Top 10 by area (label 0 is the background)
+        areas = stats[1:n_labels, cv2.CC_STAT_AREA]
+        top = np.argsort(areas)[::-1][:10] + 1
         
-        return hotspots
+        return [
+            {
+                "location": {
+                    "x": float(centroids[i, 0] / scale),
+                    "y": float(centroids[i, 1] / scale)
+                },
+                "area": float(stats[i, cv2.CC_STAT_AREA] / (scale * scale))
+            }
+            for i in top
+        ]
     
-    async def _analyze_distribution(self, image: np.ndarray) -> Dict[str, Any]:
+    def _analyze_distribution(self, hsv: np.ndarray) -> Dict[str, Any]:
         """تحليل توزيع الألوان في المخطط"""
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        # One pass over the hue plane, then every band's share from the
+        # histogram through the membership table
+        hist = np.bincount(hsv[:, :, 0].ravel(), minlength=180)
+        shares = _HUE_BAND_TABLE @ (hist * (100.0 / hist.sum()))
         
-        # Count pixels in hue ranges
-        ranges = {
-            "red": ((0, 10), (170, 180)),
-            "orange": ((10, 25),),
-            "yellow": ((25, 35),),
-            "green": ((35, 85),),
-            "cyan": ((85, 95),),
-            "blue": ((95, 135),),
-            "purple": ((135, 170),)
+        distribution = {
+            color_name: round(float(share), 2)
+            for color_name, share in zip(_HUE_RANGES, shares)
         }
         
-        distribution = {}
-        total_pixels = image.shape[0] * image.shape[1]
-        
-        for color_name, hue_ranges in ranges.items():
-            count = 0
-            for hue_range in hue_ranges:
-                mask = cv2.inRange(hsv[:, :, 0], hue_range[0], hue_range[1])
-                count += np.count_nonzero(mask)
-            
-            distribution[color_name] = round(count / total_pixels * 100, 2)
-        
         return distribution
     
-    async def _get_color_name(self, r: int, g: int, b: int) -> str:
-        """الحصول على اسم اللون التقريبي"""
-        # Convert to HSV for better color naming
-        hsv = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-        hue = hsv[0] * 360
-        sat = hsv[1] * 100
-        val = hsv[2] * 100
+    @staticmethod
+    def _get_color_names(colors_bgr: np.ndarray) -> List[str]:
+        """الحصول على أسماء الألوان التقريبية لمصفوفة ألوان (k, 3) BGR دفعة واحدة"""
+        # Vectorized RGB -> HSV (same formula as colorsys.rgb_to_hsv)
+        rgb = np.asarray(colors_bgr, dtype=np.float64).reshape(-1, 3)[:, ::-1] / 255.0
+        r, g, b = rgb.T
+        maxc = rgb.max(axis=1)
+        delta = maxc - rgb.min(axis=1)
         
-        # Very dark or light
-        if val < 20:
-            return "أسود"
-        if val > 90 and sat < 10:
-            return "أبيض"
-        if sat < 20:
-            return "رمادي"
+        sat = delta / np.where(maxc > 0, maxc, 1.0) * 100
+        safe = np.where(delta > 0, delta, 1.0)
+        rc = (maxc - r) / safe
+        gc = (maxc - g) / safe
+        bc = (maxc - b) / safe
+        hue = np.select(
+            [delta == 0, maxc == r, maxc == g],
+            [0.0, bc - gc, 2.0 + rc - bc],
+            4.0 + gc - rc
+        )
+        hue = (hue / 6.0) % 1.0 * 360
+        val = maxc * 100
         
-        # Hue-based names
-        if hue < 15 or hue >= 345:
-            return "أحمر"
-        elif hue < 45:
-            return "برتقالي"
-        elif hue < 70:
-            return "أصفر"
-        elif hue < 150:
-            return "أخضر"
-        elif hue < 210:
-            return "أزرق سماوي"
-        elif hue < 270:
-            return "أزرق"
-        elif hue < 330:
-            return "بنفسجي"
-        else:
-            return "وردي"
+        names = np.select(
+            [
+                # Very dark or light
+                val < 20,
+                (val > 90) & (sat < 10),
+                sat < 20,
+                # Hue-based names
+                (hue < 15) | (hue >= 345),
+                hue < 45,
+                hue < 70,
+                hue < 150,
+                hue < 210,
+                hue < 270,
+                hue < 330,
+            ],
+            [
+                "أسود", "أبيض", "رمادي",
+                "أحمر", "برتقالي", "أصفر", "أخضر", "أزرق سماوي", "أزرق", "بنفسجي",
+            ],
+            default="وردي"
+        )
+        return names.tolist()
     
-    async def _generate_recommendations(
+    def _generate_recommendations(
         self,
         colors: List[Dict],
         stats: Dict
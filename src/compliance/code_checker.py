@@ -2,13 +2,39 @@
 Code Checker - فاحص الكود
 فحص الامتثال للاشتراطات والكودات
 """
-import numpy as np
-from typing import Dict, List, Any
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping
 from loguru import logger
 
 from src.config import settings
 
 
+# Code rules by building type (read-only, shared by every checker)
+_BUILDING_RULES: Mapping[str, Mapping[str, float]] = MappingProxyType({
+    "hospital": MappingProxyType({
+        "min_corridor_width": 2.4,  # meters
+        "min_door_width": 1.2,
+        "max_egress_distance": 45.0,
+        "min_exits": 2,
+        "min_stair_width": 1.5
+    }),
+    "office": MappingProxyType({
+        "min_corridor_width": 1.2,
+        "min_door_width": 0.9,
+        "max_egress_distance": 60.0,
+        "min_exits": 2,
+        "min_stair_width": 1.1
+    }),
+    "residential": MappingProxyType({
+        "min_corridor_width": 1.0,
+        "min_door_width": 0.8,
+        "max_egress_distance": 75.0,
+        "min_exits": 1,
+        "min_stair_width": 0.9
+    })
+})
+
+
 class CodeChecker:
     """فاحص الكود والامتثال"""
     
@@ -16,33 +42,9 @@ class CodeChecker:
         self.building_type = building_type
         self.rules = self._load_rules()
     
-    def _load_rules(self) -> Dict[str, Any]:
+    def _load_rules(self) -> Mapping[str, float]:
         """تحميل قواعد الكود بحسب نوع المبنى"""
-        rules = {
-            "hospital": {
-                "min_corridor_width": 2.4,  # meters
-                "min_door_width": 1.2,
-                "max_egress_distance": 45.0,
-                "min_exits": 2,
-                "min_stair_width": 1.5
-            },
-            "office": {
-                "min_corridor_width": 1.2,
-                "min_door_width": 0.9,
-                "max_egress_distance": 60.0,
-                "min_exits": 2,
-                "min_stair_width": 1.1
-            },
-            "residential": {
-                "min_corridor_width": 1.0,
-                "min_door_width": 0.8,
-                "max_egress_distance": 75.0,
-                "min_exits": 1,
-                "min_stair_width": 0.9
-            }
-        }
-        
-        return rules.get(self.building_type, rules["office"])
+        return _BUILDING_RULES.get(self.building_type, _BUILDING_RULES["office"])
     
     async def check(self, elements: Dict, areas: Dict, metrics: Dict) -> Dict[str, Any]:
         """
@@ -62,16 +64,16 @@ class CodeChecker:
             checks = []
             
             # Check corridor widths
-            checks.extend(await self._check_corridor_widths(elements))
+            checks.extend(self._check_corridor_widths(elements))
             
             # Check door widths
-            checks.extend(await self._check_door_widths(elements))
+            checks.extend(self._check_door_widths(elements))
             
             # Check egress distances
-            checks.extend(await self._check_egress(elements, areas))
+            checks.extend(self._check_egress(elements, areas))
             
             # Check exit count
-            checks.extend(await self._check_exits(elements))
+            checks.extend(self._check_exits(elements))
             
             # Calculate compliance score
             compliant_count = sum(1 for c in checks if c["compliant"])
@@ -92,7 +94,7 @@ class CodeChecker:
                 "critical_issues": len(critical),
                 "warnings": len(warnings),
                 "checks": checks,
-                "summary": await self._generate_summary(checks)
+                "summary": self._generate_summary(checks)
             }
             
             return result
@@ -101,88 +103,101 @@ class CodeChecker:
             logger.error(f"❌ Error checking compliance: {str(e)}")
             return {}
     
-    async def _check_corridor_widths(self, elements: Dict) -> List[Dict]:
+    def _check_corridor_widths(self, elements: Dict) -> List[Dict]:
         """فحص عروض الممرات"""
-        checks = []
-        corridors = elements.get("corridors", [])
-        min_width = self.rules["min_corridor_width"]
-        
-        for corridor in corridors:
-            width = corridor.get("width", 0)
-            compliant = width >= min_width
-            
-            checks.append({
-                "category": "circulation",
-                "requirement": f"الحد الأدنى لعرض الممر: {min_width}m",
-                "element_id": corridor["id"],
-                "actual_value": round(width, 2),
-                "required_value": min_width,
-                "compliant": compliant,
-                "severity": "critical" if not compliant else "info",
-                "message": "مطابق" if compliant else f"عرض غير كافٍ: {round(width, 2)}m"
-            })
+        items = elements.get("corridors")
+        if not items:
+            return []
         
-        return checks
+        min_width = self.rules["min_corridor_width"]
+        return self._width_checks(
+            items,
+            category="circulation",
+            requirement=f"الحد الأدنى لعرض الممر: {min_width}m",
+            min_width=min_width,
+            fail_severity="critical",
+            fail_message="عرض غير كافٍ: {}m"
+        )
     
-    async def _check_door_widths(self, elements: Dict) -> List[Dict]:
+    def _check_door_widths(self, elements: Dict) -> List[Dict]:
         """فحص عروض الأبواب"""
-        checks = []
-        doors = elements.get("doors", [])
+        items = elements.get("doors")
+        if not items:
+            return []
+        
         min_width = self.rules["min_door_width"]
+        return self._width_checks(
+            items,
+            category="access",
+            requirement=f"الحد الأدنى لعرض الباب: {min_width}m",
+            min_width=min_width,
+            fail_severity="warning",
+            fail_message="باب ضيق: {}m"
+        )
+    
+    @staticmethod
+    def _width_checks(
+        items: List[Dict],
+        category: str,
+        requirement: str,
+        min_width: float,
+        fail_severity: str,
+        fail_message: str
+    ) -> List[Dict]:
+        """
+        فحص عرض مجموعة عناصر مقابل حد أدنى
         
-        for door in doors:
-            width = door.get("width", 0)
-            compliant = width >= min_width
-            
-            checks.append({
-                "category": "access",
-                "requirement": f"الحد الأدنى لعرض الباب: {min_width}m",
-                "element_id": door["id"],
+        Strings shared by every row are built once by the caller; only the
+        per-element fields vary.
+        """
+        widths = [item.get("width", 0) for item in items]
+        return [
+            {
+                "category": category,
+                "requirement": requirement,
+                "element_id": item["id"],
                 "actual_value": round(width, 2),
                 "required_value": min_width,
-                "compliant": compliant,
-                "severity": "warning" if not compliant else "info",
-                "message": "مطابق" if compliant else f"باب ضيق: {round(width, 2)}m"
-            })
-        
-        return checks
+                "compliant": width >= min_width,
+                "severity": "info" if width >= min_width else fail_severity,
+                "message": "مطابق" if width >= min_width else fail_message.format(round(width, 2))
+            }
+            for item, width in zip(items, widths)
+        ]
     
-    async def _check_egress(self, elements: Dict, areas: Dict) -> List[Dict]:
+    def _check_egress(self, elements: Dict, areas: Dict) -> List[Dict]:
         """فحص مسافات الإخلاء"""
         checks = []
         max_distance = self.rules["max_egress_distance"]
+        requirement = f"أقصى مسافة إخلاء: {max_distance}m"
         
         # Simplified: check if any room exceeds maximum dimension
-        rooms = elements.get("rooms", [])
-        
-        for room in rooms[:20]:  # Sample
-            # Estimate max travel distance (diagonal)
+        for room in elements.get("rooms", [])[:20]:  # Sample
             polygon = room.get("polygon", [])
             if len(polygon) < 2:
                 continue
             
+            # Estimate max travel distance from the bounding box
             xs = [p["x"] for p in polygon]
             ys = [p["y"] for p in polygon]
-            
-            # Convert pixels to meters (approximate)
-            max_dim = max(max(xs) - min(xs), max(ys) - min(ys)) / 100  # rough estimate
-            
-            compliant = max_dim < max_distance
+            max_dim = max(max(xs) - min(xs), max(ys) - min(ys))
+            max_dim_m = max_dim / 100  # Rough estimate
+            compliant = max_dim_m < max_distance
             
             checks.append({
                 "category": "egress",
-                "requirement": f"أقصى مسافة إخلاء: {max_distance}m",
+                "requirement": requirement,
                 "element_id": room["id"],
-                "actual_value": round(max_dim, 2),
+                "actual_value": round(max_dim_m, 2),
                 "required_value": max_distance,
                 "compliant": compliant,
-                "severity": "critical" if not compliant else "info",
+                "severity": "info" if compliant else "critical",
                 "message": "مطابق" if compliant else "مسافة إخلاء مفرطة"
             })
         
         return checks
     
-    async def _check_exits(self, elements: Dict) -> List[Dict]:
+    def _check_exits(self, elements: Dict) -> List[Dict]:
         """فحص عدد المخارج"""
         checks = []
         min_exits = self.rules["min_exits"]
@@ -208,7 +223,7 @@ class CodeChecker:
         
         return checks
     
-    async def _generate_summary(self, checks: List[Dict]) -> Dict[str, Any]:
+    def _generate_summary(self, checks: List[Dict]) -> Dict[str, Any]:
         """توليد ملخص النتائج"""
         if not checks:
             return {}
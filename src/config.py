@@ -1,8 +1,9 @@
 """
 Configuration Management - إدارة الإعدادات
 """
+from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 
 
@@ -16,6 +17,8 @@ class Settings(BaseSettings):
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     api_workers: int = 4
+    api_backlog: int = 2048
+    api_limit_concurrency: Optional[int] = None
     
     # Database
     database_url: str = "postgresql://fpa_user:password@db:5432/fpa_db"
@@ -25,6 +28,9 @@ class Settings(BaseSettings):
     # Redis
     redis_url: str = "redis://redis:6379/0"
     cache_ttl: int = 3600
+    job_ttl: int = 86400  # job status/result retention (24h)
+    result_cache_ttl: int = 86400  # reuse results for identical uploads (24h)
+    max_tracked_jobs: int = 10000  # upper bound on the job index
     
     # File Storage
     upload_dir: Path = Path("/app/data/uploads")
@@ -35,6 +41,9 @@ class Settings(BaseSettings):
     # Processing
     max_concurrent_jobs: int = 5
     job_timeout: int = 600
+    cpu_pool_workers: Optional[int] = None  # CV process pool size (None = CPU count)
+    denoise_mode: str = "bilateral"  # bilateral | gaussian | nlmeans (slowest)
+    max_image_edge: int = 2000  # longest edge processed in pixels (0 = full resolution)
     
     # OCR Settings
     tesseract_lang: str = "ara+eng"
@@ -68,6 +77,8 @@ class Settings(BaseSettings):
         "https://wfapi.aqeeli.com",
         "http://localhost:3000"
     ]
+    allowed_methods: List[str] = ["GET", "POST", "DELETE"]
+    allowed_headers: List[str] = ["content-type", "authorization", "if-none-match", "range"]
     
     # Monitoring
     log_level: str = "INFO"
@@ -83,12 +94,24 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    الإعدادات (تُقرأ مرة واحدة لكل عملية)
+    
+    .env is parsed and validated on first call only; call
+    get_settings.cache_clear() to reload.
+    """
+    return Settings()
+
+
+# Global settings instance (kept for existing `from src.config import settings`)
+settings = get_settings()
 
 
 def ensure_directories():
     """إنشاء المجلدات المطلوبة"""
-    settings.upload_dir.mkdir(parents=True, exist_ok=True)
-    settings.output_dir.mkdir(parents=True, exist_ok=True)
-    settings.cache_dir.mkdir(parents=True, exist_ok=True)
+    current = get_settings()
+    current.upload_dir.mkdir(parents=True, exist_ok=True)
+    current.output_dir.mkdir(parents=True, exist_ok=True)
+    current.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,235 @@
+"""
+Job Store - مخزن المهام
+حالة المهام ونتائجها في Redis لتشاركها جميع عمليات الخادم
+"""
+import hashlib
+import time
+from typing import Dict, Any, Optional, AsyncIterator, List
+
+import orjson
+import zstandard
+from redis.asyncio import Redis
+
+from src.config import settings
+
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Result payloads are stored zstd-compressed (JSON compresses 2-5x)
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def encode_json(value: Any) -> bytes:
+    """ترميز قيمة كـ JSON (numpy arrays are serialized natively)"""
+    return orjson.dumps(value, default=str, option=_ORJSON_OPTIONS)
+
+
+def job_etag(job: Dict[str, Any]) -> str:
+    """معرف نسخة حالة المهمة (ETag) - يتغير فقط مع الحالة أو التقدم"""
+    state = f"{job.get('status')}:{job.get('progress')}:{job.get('message')}"
+    return '"' + hashlib.md5(state.encode(), usedforsecurity=False).hexdigest() + '"'
+
+
+class JobStore:
+    """
+    مخزن المهام في Redis
+
+    Layout:
+        job:{id}          HASH  - status fields (JSON-encoded values)
+        job:{id}:result   STRING - full result payload (zstd-compressed JSON)
+        job:{id}:outputs  SET   - paths of files written for the job
+        jobs:index        ZSET  - ids of known jobs scored by creation time
+                                  (trimmed to the TTL window and max_jobs)
+        cache:{key}       STRING - result payload by input content key (same encoding)
+
+    Every field update is also published on channel job:{id}.
+    """
+
+    ACTIVE_KEY = "jobs:index"
+
+    def __init__(self, redis_url: str, ttl: int, cache_ttl: int, max_jobs: int):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self.max_jobs = max_jobs
+        self.redis: Optional[Redis] = None
+
+    async def connect(self):
+        """فتح الاتصال بـ Redis"""
+        self.redis = Redis.from_url(self.redis_url)
+        await self.redis.ping()
+
+    async def close(self):
+        """إغلاق الاتصال"""
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _result_key(job_id: str) -> str:
+        return f"job:{job_id}:result"
+    
+    @staticmethod
+    def _outputs_key(job_id: str) -> str:
+        return f"job:{job_id}:outputs"
+    
+    @staticmethod
+    def _cache_key(cache_key: str) -> str:
+        return f"cache:{cache_key}"
+
+    async def create(self, job_id: str, fields: Dict[str, Any]):
+        """تسجيل مهمة جديدة"""
+        key = self._key(job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={k: encode_json(v) for k, v in fields.items()})
+            pipe.expire(key, self.ttl)
+            
+            # Index the job and drop entries that expired or overflow
+            now = time.time()
+            pipe.zadd(self.ACTIVE_KEY, {job_id: now})
+            pipe.zremrangebyscore(self.ACTIVE_KEY, "-inf", now - self.ttl)
+            pipe.zremrangebyrank(self.ACTIVE_KEY, 0, -self.max_jobs - 1)
+            await pipe.execute()
+
+    async def update(self, job_id: str, fields: Dict[str, Any]):
+        """تحديث حقول المهمة ونشر التحديث للمشتركين"""
+        key = self._key(job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={k: encode_json(v) for k, v in fields.items()})
+            pipe.publish(key, encode_json(fields))
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """قراءة حالة المهمة (None إن لم توجد)"""
+        raw = await self.redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {k.decode(): orjson.loads(v) for k, v in raw.items()}
+
+    async def listen(
+        self,
+        job_id: str,
+        idle_timeout: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        الاشتراك في تحديثات المهمة
+
+        Yields the current job state first (subscribing beforehand so no
+        update is missed), then each published field update. None is
+        yielded whenever nothing arrives for idle_timeout seconds, so the
+        caller can send a keep-alive and check the job still exists.
+        """
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._key(job_id))
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield job
+
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=idle_timeout
+                )
+                yield orjson.loads(message["data"]) if message else None
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def exists(self, job_id: str) -> bool:
+        """هل المهمة موجودة"""
+        return bool(await self.redis.exists(self._key(job_id)))
+
+    async def set_result(
+        self,
+        job_id: str,
+        result: Dict[str, Any],
+        cache_key: Optional[str] = None
+    ):
+        """
+        حفظ النتيجة الكاملة بمدة صلاحية
+        
+        Args:
+            cache_key: مفتاح المحتوى - إن وُجد تُحفظ النتيجة أيضاً لإعادة استخدامها
+        """
+        raw = _compressor.compress(encode_json(result))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._result_key(job_id), raw, ex=self.ttl)
+            if cache_key:
+                pipe.set(self._cache_key(cache_key), raw, ex=self.cache_ttl)
+            await pipe.execute()
+    
+    async def get_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """نتيجة سابقة لنفس المدخلات (None إن لم توجد)"""
+        raw = await self.redis.get(self._cache_key(cache_key))
+        if raw is None:
+            return None
+        return orjson.loads(self._decompress(raw))
+
+    async def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """قراءة النتيجة الكاملة"""
+        raw = await self.get_result_json(job_id)
+        if raw is None:
+            return None
+        return orjson.loads(raw)
+    
+    async def get_result_json(self, job_id: str) -> Optional[bytes]:
+        """قراءة النتيجة الكاملة كـ JSON خام (بدون فك الترميز)"""
+        raw = await self.redis.get(self._result_key(job_id))
+        if raw is None:
+            return None
+        return self._decompress(raw)
+    
+    @staticmethod
+    def _decompress(raw: bytes) -> bytes:
+        # Payloads written before compression was enabled are plain JSON
+        if raw.startswith(_ZSTD_MAGIC):
+            return _decompressor.decompress(raw)
+        return raw
+
+    async def add_outputs(self, job_id: str, *paths: str):
+        """تسجيل ملفات ناتجة عن المهمة (لحذفها مع المهمة)"""
+        if not paths:
+            return
+        key = self._outputs_key(job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(key, *paths)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+    
+    async def get_outputs(self, job_id: str) -> List[str]:
+        """مسارات الملفات الناتجة عن المهمة"""
+        return [p.decode() for p in await self.redis.smembers(self._outputs_key(job_id))]
+
+    async def delete(self, job_id: str, cache_key: Optional[str] = None):
+        """
+        حذف المهمة ونتيجتها (ونشر حالة "deleted" للمشتركين)
+        
+        Args:
+            cache_key: مفتاح المحتوى - إن وُجد تُحذف النتيجة المحفوظة له أيضاً
+        """
+        keys = [self._key(job_id), self._result_key(job_id), self._outputs_key(job_id)]
+        if cache_key:
+            keys.append(self._cache_key(cache_key))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*keys)
+            pipe.zrem(self.ACTIVE_KEY, job_id)
+            # ينهي بث الأحداث المفتوح لهذه المهمة
+            pipe.publish(self._key(job_id), encode_json({"status": "deleted"}))
+            await pipe.execute()
+
+
+# Shared instance used by the API apps and the background workers
+job_store = JobStore(
+    settings.redis_url,
+    settings.job_ttl,
+    settings.result_cache_ttl,
+    settings.max_tracked_jobs
+)
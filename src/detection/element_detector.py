@@ -2,22 +2,48 @@
 Element Detector - كاشف العناصر
 اكتشاف الجدران والأبواب والنوافذ والغرف
 """
+import asyncio
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterator, Tuple
 from loguru import logger
-import uuid
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+import secrets
 
+from src import gpu
 from src.config import settings
 
 
+def _element_ids(prefix: str, n: int) -> Iterator[str]:
+    """
+    معرفات عشوائية للعناصر بصيغة PREFIX-xxxxxxxx
+    
+    Draws the random bytes for up to n ids in one call instead of one
+    uuid4() per element.
+    """
+    data = secrets.token_hex(4 * n)
+    return (f"{prefix}-{data[i:i + 8]}" for i in range(0, len(data), 8))
+
+
 class ElementDetector:
     """كاشف العناصر المعمارية"""
     
-    def __init__(self):
-        self.min_wall_length = 50  # pixels
-        self.min_door_width = 20
-        self.min_room_area = 500  # pixels²
+    def __init__(self, pixel_scale: float = 1.0):
+        """
+        Args:
+            pixel_scale: دقة الصورة نسبةً إلى المسح الكامل (1.0 = 300 DPI)
+                         - pixel thresholds are scaled to match
+        """
+        self.pixel_scale = pixel_scale
+        self.min_wall_length = 50 * pixel_scale  # pixels
+        self.wall_votes = max(1, round(100 * pixel_scale))  # Hough accumulator threshold
+        self.max_wall_gap = 10 * pixel_scale
+        self.wall_merge_distance = 20 * pixel_scale
+        self.min_door_width = 20 * pixel_scale
+        self.door_area_range = (200 * pixel_scale ** 2, 2000 * pixel_scale ** 2)  # pixels²
+        self.min_room_area = 500 * pixel_scale ** 2  # pixels²
     
     async def detect(self, image: np.ndarray) -> Dict[str, Any]:
         """
@@ -33,19 +59,18 @@ class ElementDetector:
             logger.info("🔍 Detecting architectural elements...")
             
             # Convert to grayscale and binary
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            _, binary = cv2.threshold(
-                gray, 0, 255,
-                cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
-            )
+            binary = await asyncio.to_thread(self._binarize, image)
             
-            # Detect different elements
-            walls = await self._detect_walls(binary, image)
-            doors = await self._detect_doors(binary, image)
-            windows = await self._detect_windows(binary, image)
-            rooms = await self._detect_rooms(binary, walls)
-            corridors = await self._detect_corridors(rooms)
-            stairs = await self._detect_stairs(binary, image)
+            # The detectors only read the binary image and OpenCV releases
+            # the GIL, so they run side by side in worker threads
+            walls, doors, (rooms, room_polygons) = await asyncio.gather(
+                asyncio.to_thread(self._detect_walls, binary, image),
+                asyncio.to_thread(self._detect_doors, binary, image),
+                asyncio.to_thread(self._detect_rooms, binary)
+            )
+            windows = self._detect_windows(binary, image)
+            corridors = self._detect_corridors(rooms, room_polygons)
+            stairs = self._detect_stairs(binary, image)
             
             elements = {
                 "walls": walls,
@@ -66,7 +91,17 @@ class ElementDetector:
             logger.error(f"❌ Error detecting elements: {str(e)}")
             raise
     
-    async def _detect_walls(
+    @staticmethod
+    def _binarize(image: np.ndarray) -> np.ndarray:
+        """صورة ثنائية (الخطوط بيضاء) بعتبة Otsu"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(
+            gray, 0, 255,
+            cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
+        )
+        return binary
+    
+    def _detect_walls(
         self,
         binary: np.ndarray,
         original: np.ndarray
@@ -74,126 +109,129 @@ class ElementDetector:
         """اكتشاف الجدران باستخدام Hough Transform"""
         try:
             # Detect edges
-            edges = cv2.Canny(binary, 50, 150, apertureSize=3)
+            edges = gpu.canny(binary, 50, 150, aperture_size=3)
             
             # Detect lines using Hough Transform
-            lines = cv2.HoughLinesP(
+            lines = gpu.hough_segments(
                 edges,
                 rho=1,
                 theta=np.pi/180,
-                threshold=100,
-                minLineLength=self.min_wall_length,
-                maxLineGap=10
+                threshold=self.wall_votes,
+                min_line_length=self.min_wall_length,
+                max_line_gap=self.max_wall_gap
             )
             
             if lines is None:
                 return []
             
-            walls = []
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                
-                # Calculate wall properties
-                length = np.sqrt((x2-x1)**2 + (y2-y1)**2)
-                
-                if length < self.min_wall_length:
-                    continue
-                
-                wall = {
-                    "id": f"W-{str(uuid.uuid4())[:8]}",
-                    "start": {"x": float(x1), "y": float(y1)},
-                    "end": {"x": float(x2), "y": float(y2)},
-                    "length": float(length),
-                    "thickness": 10.0,  # Default, would need better detection
-                    "angle": float(np.degrees(np.arctan2(y2-y1, x2-x1)))
-                }
-                
-                walls.append(wall)
+            # Segments as an (N, 4) array of x1, y1, x2, y2
+            segments = lines.reshape(-1, 4).astype(np.float64)
+            dx = segments[:, 2] - segments[:, 0]
+            dy = segments[:, 3] - segments[:, 1]
+            
+            keep = np.hypot(dx, dy) >= self.min_wall_length
+            segments = segments[keep]
+            angles = np.degrees(np.arctan2(dy[keep], dx[keep]))
             
             # Merge nearby parallel walls
-            walls = await self._merge_walls(walls)
+            segments, angles = self._merge_walls(
+                segments, angles, distance_threshold=self.wall_merge_distance
+            )
+            lengths = np.hypot(
+                segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1]
+            )
             
-            return walls
+            # Wall dicts are only built for the merged result
+            ids = _element_ids("W", len(segments))
+            return [
+                {
+                    "id": next(ids),
+                    "start": {"x": x1, "y": y1},
+                    "end": {"x": x2, "y": y2},
+                    "length": length,
+                    "thickness": 10.0,  # Default, would need better detection
+                    "angle": angle
+                }
+                for (x1, y1, x2, y2), length, angle in zip(
+                    segments.tolist(), lengths.tolist(), angles.tolist()
+                )
+            ]
             
         except Exception as e:
             logger.warning(f"⚠️ Error detecting walls: {str(e)}")
             return []
     
-    async def _merge_walls(self, walls: List[Dict]) -> List[Dict]:
-        """دمج الجدران المتقاربة والمتوازية"""
-        if len(walls) < 2:
-            return walls
-        
-        merged = []
-        used = set()
-        
-        for i, wall1 in enumerate(walls):
-            if i in used:
-                continue
-            
-            current = wall1.copy()
-            
-            for j, wall2 in enumerate(walls[i+1:], i+1):
-                if j in used:
-                    continue
-                
-                # Check if walls are similar and close
-                if await self._are_walls_mergeable(current, wall2):
-                    # Merge by extending endpoints
-                    current = await self._extend_wall(current, wall2)
-                    used.add(j)
-            
-            merged.append(current)
-            used.add(i)
-        
-        return merged
-    
-    async def _are_walls_mergeable(
+    def _merge_walls(
         self,
-        wall1: Dict,
-        wall2: Dict,
+        segments: np.ndarray,
+        angles: np.ndarray,
         angle_threshold: float = 10.0,
         distance_threshold: float = 20.0
-    ) -> bool:
-        """فحص إمكانية دمج جدارين"""
-        # Check angle similarity
-        angle_diff = abs(wall1["angle"] - wall2["angle"])
-        if angle_diff > angle_threshold and angle_diff < (180 - angle_threshold):
-            return False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        دمج الجدران المتقاربة والمتوازية
         
-        # Check distance between walls
-        p1 = np.array([wall1["start"]["x"], wall1["start"]["y"]])
-        p2 = np.array([wall2["start"]["x"], wall2["start"]["y"]])
-        distance = np.linalg.norm(p1 - p2)
+        Walls whose start points are closer than distance_threshold and whose
+        angles differ by at most angle_threshold (or are near-opposite) are
+        grouped transitively; each group becomes one wall spanning its extreme
+        endpoints.
         
-        return distance < distance_threshold
-    
-    async def _extend_wall(self, wall1: Dict, wall2: Dict) -> Dict:
-        """مد جدار بدمج جدار آخر"""
-        # Simple implementation - take extremes
-        all_points = [
-            (wall1["start"]["x"], wall1["start"]["y"]),
-            (wall1["end"]["x"], wall1["end"]["y"]),
-            (wall2["start"]["x"], wall2["start"]["y"]),
-            (wall2["end"]["x"], wall2["end"]["y"])
-        ]
+        Args:
+            segments: (N, 4) x1, y1, x2, y2
+            angles: (N,) زاوية كل جدار بالدرجات
         
-        # Find leftmost and rightmost (or topmost/bottommost)
-        all_points.sort()
+        Returns:
+            (segments, angles) بعد الدمج - merged walls keep the angle of
+            their first member
+        """
+        n = len(segments)
+        if n < 2:
+            return segments, angles
         
-        new_wall = wall1.copy()
-        new_wall["start"] = {"x": all_points[0][0], "y": all_points[0][1]}
-        new_wall["end"] = {"x": all_points[-1][0], "y": all_points[-1][1]}
+        starts = segments[:, :2]
+        
+        # Candidate pairs by start-point distance (no N x N matrix), then the
+        # angle test on just those pairs
+        pairs = cKDTree(starts).query_pairs(distance_threshold, output_type="ndarray")
+        i, j = pairs.T
+        distance = np.hypot(*(starts[i] - starts[j]).T)
+        diff = np.abs(angles[i] - angles[j])
+        pairs = pairs[
+            (distance < distance_threshold)
+            & ((diff <= angle_threshold) | (diff >= 180 - angle_threshold))
+        ]
         
-        # Recalculate length
-        new_wall["length"] = np.sqrt(
-            (new_wall["end"]["x"] - new_wall["start"]["x"])**2 +
-            (new_wall["end"]["y"] - new_wall["start"]["y"])**2
+        adjacency = coo_matrix(
+            (np.ones(len(pairs), dtype=bool), (pairs[:, 0], pairs[:, 1])),
+            shape=(n, n)
         )
+        n_groups, labels = connected_components(adjacency, directed=False)
+        if n_groups == n:
+            return segments, angles
         
-        return new_wall
+        # Extreme endpoints of every group in (x, y) order: leftmost and
+        # rightmost (or topmost/bottommost for vertical walls). Sorting all
+        # endpoints by (group, x, y) puts each group's extremes at the ends
+        # of its run.
+        points = np.concatenate((starts, segments[:, 2:]))
+        point_labels = np.concatenate((labels, labels))
+        order = np.lexsort((points[:, 1], points[:, 0], point_labels))
+        run_start = np.searchsorted(point_labels[order], np.arange(n_groups))
+        run_end = np.append(run_start[1:], len(order)) - 1
+        extents = np.hstack((points[order[run_start]], points[order[run_end]]))
+        
+        # Groups in order of their first wall; single walls stay as they are
+        _, first = np.unique(labels, return_index=True)
+        first.sort()
+        group = labels[first]
+        
+        merged = segments[first]
+        multi = np.bincount(labels, minlength=n_groups)[group] > 1
+        merged[multi] = extents[group[multi]]
+        
+        return merged, angles[first]
     
-    async def _detect_doors(
+    def _detect_doors(
         self,
         binary: np.ndarray,
         original: np.ndarray
@@ -206,8 +244,6 @@ class ElementDetector:
             # Simplified door detection using contours
             # In production, use trained YOLO model
             
-            doors = []
-            
             # Find contours that might be door symbols
             contours, _ = cv2.findContours(
                 binary,
@@ -215,34 +251,41 @@ class ElementDetector:
                 cv2.CHAIN_APPROX_SIMPLE
             )
             
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                
-                # Doors are typically small rectangular shapes
-                if 200 < area < 2000:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    # Check aspect ratio (doors are elongated)
-                    aspect_ratio = max(w, h) / min(w, h) if min(w, h) > 0 else 0
-                    
-                    if 2 < aspect_ratio < 10:
-                        door = {
-                            "id": f"D-{str(uuid.uuid4())[:8]}",
-                            "location": {"x": float(x + w/2), "y": float(y + h/2)},
-                            "width": float(max(w, h)),
-                            "swing_direction": "unknown",
-                            "from_room": None,
-                            "to_room": None
-                        }
-                        doors.append(door)
+            # Doors are typically small rectangular shapes: filter by area
+            # first, bounding boxes only for the survivors
+            min_area, max_area = self.door_area_range
+            areas = np.array([cv2.contourArea(c) for c in contours], dtype=np.float64)
+            candidates = np.flatnonzero((areas > min_area) & (areas < max_area))
+            rects = np.array(
+                [cv2.boundingRect(contours[i]) for i in candidates], dtype=np.int64
+            ).reshape(-1, 4)
             
-            return doors[:50]  # Limit to reasonable number
+            # Check aspect ratio (doors are elongated)
+            short_side = np.minimum(rects[:, 2], rects[:, 3])
+            long_side = np.maximum(rects[:, 2], rects[:, 3])
+            aspect_ratio = long_side / np.maximum(short_side, 1)
+            rects = rects[(short_side > 0) & (aspect_ratio > 2) & (aspect_ratio < 10)][:50]
+            
+            ids = _element_ids("D", len(rects))
+            doors = [
+                {
+                    "id": next(ids),
+                    "location": {"x": float(x + w/2), "y": float(y + h/2)},
+                    "width": float(max(w, h)),
+                    "swing_direction": "unknown",
+                    "from_room": None,
+                    "to_room": None
+                }
+                for x, y, w, h in rects.tolist()
+            ]
+            
+            return doors  # At most 50
             
         except Exception as e:
             logger.warning(f"⚠️ Error detecting doors: {str(e)}")
             return []
     
-    async def _detect_windows(
+    def _detect_windows(
         self,
         binary: np.ndarray,
         original: np.ndarray
@@ -252,12 +295,18 @@ class ElementDetector:
         # In production, use trained model
         return []
     
-    async def _detect_rooms(
+    def _detect_rooms(
         self,
-        binary: np.ndarray,
-        walls: List[Dict]
-    ) -> List[Dict[str, Any]]:
-        """اكتشاف الغرف بتحليل المساحات المغلقة"""
+        binary: np.ndarray
+    ) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+        """
+        اكتشاف الغرف بتحليل المساحات المغلقة
+        
+        Returns:
+            (الغرف, مضلعات الغرف كمصفوفات (N, 2) float32 بنفس الترتيب)
+            The arrays are only used for the corridor extents; the dict
+            form is what leaves the detector.
+        """
         try:
             # Find closed contours that represent rooms
             # Invert binary for room detection
@@ -269,14 +318,18 @@ class ElementDetector:
                 cv2.CHAIN_APPROX_SIMPLE
             )
             
+            # Areas first; the remaining properties are only computed for the
+            # largest rooms that are kept (largest first)
+            areas = np.array([cv2.contourArea(c) for c in contours], dtype=np.float64)
+            keep = np.flatnonzero(areas >= self.min_room_area)
+            keep = keep[np.argsort(-areas[keep], kind="stable")][:100]
+            
             rooms = []
+            polygons = []
+            ids = _element_ids("R", len(keep))
             
-            for i, contour in enumerate(contours):
-                area = cv2.contourArea(contour)
-                
-                # Filter by minimum area
-                if area < self.min_room_area:
-                    continue
+            for i in keep.tolist():
+                contour = contours[i]
                 
                 # Get room properties
                 M = cv2.moments(contour)
@@ -287,66 +340,62 @@ class ElementDetector:
                 cy = M["m01"] / M["m00"]
                 
                 # Get polygon points
-                epsilon = 0.01 * cv2.arcLength(contour, True)
-                approx = cv2.approxPolyDP(contour, epsilon, True)
-                
-                polygon = [
-                    {"x": float(point[0][0]), "y": float(point[0][1])}
-                    for point in approx
-                ]
-                
                 perimeter = cv2.arcLength(contour, True)
+                approx = cv2.approxPolyDP(contour, 0.01 * perimeter, True)
+                polygon_xy = approx.reshape(-1, 2).astype(np.float32)
                 
                 room = {
-                    "id": f"R-{str(uuid.uuid4())[:8]}",
+                    "id": next(ids),
                     "name": None,  # Would need OCR
                     "function": None,
-                    "area": float(area),
+                    "area": float(areas[i]),
                     "perimeter": float(perimeter),
                     "centroid": {"x": float(cx), "y": float(cy)},
-                    "polygon": polygon,
+                    "polygon": [{"x": x, "y": y} for x, y in polygon_xy.tolist()],
                     "floor_level": 0
                 }
                 
                 rooms.append(room)
+                polygons.append(polygon_xy)
             
-            # Sort by area (largest first)
-            rooms.sort(key=lambda r: r["area"], reverse=True)
-            
-            return rooms[:100]  # Limit to reasonable number
+            return rooms, polygons
             
         except Exception as e:
             logger.warning(f"⚠️ Error detecting rooms: {str(e)}")
-            return []
+            return [], []
     
-    async def _detect_corridors(self, rooms: List[Dict]) -> List[Dict[str, Any]]:
+    def _detect_corridors(
+        self,
+        rooms: List[Dict],
+        polygons: List[np.ndarray]
+    ) -> List[Dict[str, Any]]:
         """تحديد الممرات من الغرف (الغرف الطويلة الضيقة)"""
-        corridors = []
+        if not rooms:
+            return []
         
-        for room in rooms:
-            # Calculate aspect ratio
-            x_coords = [p["x"] for p in room["polygon"]]
-            y_coords = [p["y"] for p in room["polygon"]]
-            
-            width = max(x_coords) - min(x_coords)
-            height = max(y_coords) - min(y_coords)
-            
-            aspect_ratio = max(width, height) / min(width, height) if min(width, height) > 0 else 0
-            
-            # Corridors are elongated (high aspect ratio)
-            if aspect_ratio > 3:
-                corridor = {
-                    "id": f"C-{room['id'].split('-')[1]}",
-                    "area": room["area"],
-                    "width": float(min(width, height)),
-                    "length": float(max(width, height)),
-                    "polygon": room["polygon"]
-                }
-                corridors.append(corridor)
+        # Bounding-box extents (width, height) of every room
+        extents = np.array([np.ptp(p, axis=0) for p in polygons])
         
-        return corridors
+        # Calculate aspect ratio
+        widths = extents.min(axis=1)
+        lengths = extents.max(axis=1)
+        aspect_ratio = np.divide(
+            lengths, widths, out=np.zeros_like(lengths), where=widths > 0
+        )
+        
+        # Corridors are elongated (high aspect ratio)
+        return [
+            {
+                "id": f"C-{rooms[i]['id'].split('-')[1]}",
+                "area": rooms[i]["area"],
+                "width": float(widths[i]),
+                "length": float(lengths[i]),
+                "polygon": rooms[i]["polygon"]
+            }
+            for i in np.flatnonzero(aspect_ratio > 3).tolist()
+        ]
     
-    async def _detect_stairs(
+    def _detect_stairs(
         self,
         binary: np.ndarray,
         original: np.ndarray
@@ -355,3 +404,42 @@ class ElementDetector:
         # Would need pattern matching for stair symbols
         # This is a placeholder
         return []
+
+
+def rescale_elements(elements: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    """
+    تحويل إحداثيات العناصر المكتشفة بمعامل ثابت
+    
+    Used to map elements detected on a downscaled image back to the
+    original pixel grid. Returns new element dicts; ids and non-geometric
+    fields are kept.
+    """
+    def point(p: Dict) -> Dict:
+        return {"x": p["x"] * factor, "y": p["y"] * factor}
+    
+    def polygon(points: List[Dict]) -> List[Dict]:
+        return [point(p) for p in points]
+    
+    area_factor = factor * factor
+    return {
+        **elements,
+        "walls": [
+            {**w, "start": point(w["start"]), "end": point(w["end"]),
+             "length": w["length"] * factor}
+            for w in elements.get("walls", [])
+        ],
+        "doors": [
+            {**d, "location": point(d["location"]), "width": d["width"] * factor}
+            for d in elements.get("doors", [])
+        ],
+        "rooms": [
+            {**r, "area": r["area"] * area_factor, "perimeter": r["perimeter"] * factor,
+             "centroid": point(r["centroid"]), "polygon": polygon(r["polygon"])}
+            for r in elements.get("rooms", [])
+        ],
+        "corridors": [
+            {**c, "area": c["area"] * area_factor, "width": c["width"] * factor,
+             "length": c["length"] * factor, "polygon": polygon(c["polygon"])}
+            for c in elements.get("corridors", [])
+        ]
+    }
@@ -0,0 +1,93 @@
+"""
+GPU Kernels - نوى المعالجة على GPU
+مسارات CUDA اختيارية لعمليات OpenCV الثقيلة مع رجوع تلقائي إلى المعالج
+
+Only used when OpenCV is built with CUDA and a device is present (the pip
+wheels are CPU-only, so this is normally a no-op). Every function returns
+the same shapes as its CPU counterpart.
+"""
+from typing import Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+
+def _cuda_device_count() -> int:
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount()
+    except (AttributeError, cv2.error):
+        return 0
+
+
+CUDA_AVAILABLE = _cuda_device_count() > 0
+
+if CUDA_AVAILABLE:
+    logger.info("⚡ CUDA device found - using GPU image kernels")
+
+
+def _upload(image: np.ndarray) -> "cv2.cuda.GpuMat":
+    gpu = cv2.cuda.GpuMat()
+    gpu.upload(image)
+    return gpu
+
+
+def canny(image: np.ndarray, low: float, high: float, aperture_size: int = 3) -> np.ndarray:
+    """
+    كشف الحواف (Canny)
+
+    Note: the CUDA detector leaves a 1px border unprocessed; edges touching
+    the image frame are not needed by any caller.
+    """
+    if CUDA_AVAILABLE:
+        detector = cv2.cuda.createCannyEdgeDetector(low, high, aperture_size)
+        return detector.detect(_upload(image)).download()
+    return cv2.Canny(image, low, high, apertureSize=aperture_size)
+
+
+def hough_segments(
+    edges: np.ndarray,
+    rho: float,
+    theta: float,
+    threshold: int,
+    min_line_length: float,
+    max_line_gap: float
+) -> Optional[np.ndarray]:
+    """قطع مستقيمة (HoughLinesP) - (N, 1, 4) أو None"""
+    if CUDA_AVAILABLE:
+        detector = cv2.cuda.createHoughSegmentDetector(
+            rho, theta, int(min_line_length), int(max_line_gap), 4096, threshold
+        )
+        lines = detector.detect(_upload(edges)).download()
+        return None if lines is None else lines.reshape(-1, 1, 4)
+    return cv2.HoughLinesP(
+        edges,
+        rho=rho,
+        theta=theta,
+        threshold=threshold,
+        minLineLength=min_line_length,
+        maxLineGap=max_line_gap
+    )
+
+
+def hough_lines(
+    edges: np.ndarray,
+    rho: float,
+    theta: float,
+    threshold: int
+) -> Optional[np.ndarray]:
+    """خطوط (HoughLines) - (N, 1, 2) من (rho, theta) أو None"""
+    if CUDA_AVAILABLE:
+        detector = cv2.cuda.createHoughLinesDetector(rho, theta, threshold)
+        lines = detector.detect(_upload(edges)).download()
+        return None if lines is None else lines.reshape(-1, 1, 2)
+    return cv2.HoughLines(edges, rho, theta, threshold)
+
+
+def nl_means(gray: np.ndarray, h: float, template_size: int, search_size: int) -> np.ndarray:
+    """إزالة التشويش (NL-means)"""
+    if CUDA_AVAILABLE:
+        return cv2.cuda.fastNlMeansDenoising(
+            _upload(gray), h, search_window=search_size, block_size=template_size
+        ).download()
+    return cv2.fastNlMeansDenoising(gray, None, h, template_size, search_size)
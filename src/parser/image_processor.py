@@ -9,6 +9,7 @@ from pathlib import Path
 from typing import Tuple, Optional
 from loguru import logger
 
+from src import gpu
 from src.config import settings
 
 
@@ -18,7 +19,7 @@ class ImageProcessor:
     def __init__(self):
         self.dpi = settings.ocr_dpi
     
-    async def process(self, file_path: Path) -> np.ndarray:
+    async def process(self, file_path: Path) -> Tuple[np.ndarray, float]:
         """
         معالجة الصورة الأساسية
         
@@ -26,21 +27,25 @@ class ImageProcessor:
             file_path: مسار الملف
         
         Returns:
-            الصورة المعالجة (numpy array)
+            (الصورة المعالجة - قناة رمادية واحدة uint8 (H, W),
+             معامل التصغير نسبةً إلى الدقة الكاملة - 1.0 إن لم تُصغَّر)
+            Images larger than settings.max_image_edge are processed at
+            reduced resolution; every later stage scales with pixel count.
         """
         try:
             logger.info(f"📷 Processing image: {file_path}")
             
             # Load image
             if file_path.suffix.lower() == '.pdf':
-                image = await self._process_pdf(file_path)
+                image, factor = await self._process_pdf(file_path)
             else:
                 image = await self._load_image(file_path)
+                image, factor = self._limit_size(image)
             
             # Preprocessing pipeline
             image = await self._preprocess(image)
             
-            return image
+            return image, factor
             
         except Exception as e:
             logger.error(f"❌ Error processing image: {str(e)}")
@@ -53,15 +58,38 @@ class ImageProcessor:
             raise ValueError(f"فشل تحميل الصورة: {file_path}")
         return img
     
-    async def _process_pdf(self, file_path: Path) -> np.ndarray:
+    @staticmethod
+    def _limit_size(image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """تصغير الصورة إذا تجاوز أطول ضلع settings.max_image_edge"""
+        max_edge = settings.max_image_edge
+        longest = max(image.shape[:2])
+        if not max_edge or longest <= max_edge:
+            return image, 1.0
+        
+        factor = max_edge / longest
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        return image, factor
+    
+    async def _process_pdf(self, file_path: Path) -> Tuple[np.ndarray, float]:
         """معالجة ملف PDF"""
         try:
-            from pdf2image import convert_from_path
+            from pdf2image import convert_from_path, pdfinfo_from_path
+            
+            # Render large pages directly at a lower DPI rather than
+            # rasterizing at full DPI and shrinking afterwards
+            dpi = self.dpi
+            max_edge = settings.max_image_edge
+            if max_edge:
+                width_pt, height_pt = (
+                    float(v) for v in
+                    pdfinfo_from_path(str(file_path))["Page size"].split()[::2][:2]
+                )
+                dpi = min(dpi, max_edge * 72 / max(width_pt, height_pt))
             
             # Convert first page to image
             images = convert_from_path(
                 str(file_path),
-                dpi=self.dpi,
+                dpi=dpi,
                 first_page=1,
                 last_page=1
             )
@@ -73,7 +101,7 @@ class ImageProcessor:
             pil_image = images[0]
             image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
             
-            return image
+            return image, dpi / self.dpi
             
         except Exception as e:
             logger.error(f"❌ Error processing PDF: {str(e)}")
@@ -93,7 +121,7 @@ class ImageProcessor:
             gray = image
         
         # Denoise
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        denoised = self._denoise(gray)
         
         # Enhance contrast using CLAHE
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
@@ -102,46 +130,46 @@ class ImageProcessor:
         # Detect and correct skew
         enhanced = await self._deskew(enhanced)
         
-        # Convert back to BGR for consistency
-        processed = cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+        # Kept single-channel: a BGR copy would triple the bytes every
+        # downstream stage (and the worker process boundary) moves
+        return enhanced
+    
+    def _denoise(self, gray: np.ndarray) -> np.ndarray:
+        """
+        إزالة التشويش حسب settings.denoise_mode
         
-        return processed
+        Line drawings keep their edges under an edge-preserving bilateral
+        filter; NL-means is far slower on multi-megapixel plans and stays
+        available as an opt-in.
+        """
+        mode = settings.denoise_mode
+        if mode == "nlmeans":
+            return gpu.nl_means(gray, 10, 7, 21)
+        if mode == "gaussian":
+            return cv2.GaussianBlur(gray, (3, 3), 0)
+        return cv2.bilateralFilter(gray, 5, 30, 30)
     
     async def _deskew(self, image: np.ndarray) -> np.ndarray:
         """تصحيح ميل الصورة"""
         try:
             # Detect edges
-            edges = cv2.Canny(image, 50, 150, apertureSize=3)
+            edges = gpu.canny(image, 50, 150, aperture_size=3)
             
-            # Detect lines using Hough transform
-            lines = cv2.HoughLines(edges, 1, np.pi / 180, 200)
-            
-            if lines is None:
+            skew_angle = self._skew_angle(edges)
+            if skew_angle is None:
                 return image
             
-            # Calculate average angle
-            angles = []
-            for rho, theta in lines[:, 0]:
-                angle = np.degrees(theta) - 90
-                if -45 < angle < 45:
-                    angles.append(angle)
-            
-            if not angles:
-                return image
-            
-            median_angle = np.median(angles)
-            
             # Rotate image
-            if abs(median_angle) > 0.5:
+            if abs(skew_angle) > 0.5:
                 (h, w) = image.shape[:2]
                 center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, median_angle, 1.0)
+                M = cv2.getRotationMatrix2D(center, skew_angle, 1.0)
                 rotated = cv2.warpAffine(
                     image, M, (w, h),
                     flags=cv2.INTER_CUBIC,
                     borderMode=cv2.BORDER_REPLICATE
                 )
-                logger.info(f"🔄 Corrected skew: {median_angle:.2f}°")
+                logger.info(f"🔄 Corrected skew: {skew_angle:.2f}°")
                 return rotated
             
             return image
@@ -150,6 +178,39 @@ class ImageProcessor:
             logger.warning(f"⚠️ Could not deskew image: {str(e)}")
             return image
     
+    @staticmethod
+    def _skew_angle(edges: np.ndarray) -> Optional[float]:
+        """
+        زاوية ميل المخطط بالدرجات (None إن تعذر تقديرها)
+        
+        The minimum-area rectangle around a subsample of edge pixels gives
+        the drawing's orientation in one pass, but it measures the outline
+        of the hull: it is only trusted when the hull fills its rectangle
+        (a rectangular footprint). Angled wings, sparse edge maps and other
+        irregular outlines fall back to the median angle of Hough lines.
+        """
+        ys, xs = np.nonzero(edges)
+        points = np.column_stack((xs[::8], ys[::8])).astype(np.int32)
+        if len(points) >= 500:
+            (_, _), (w, h), angle = cv2.minAreaRect(points)
+            hull_area = cv2.contourArea(cv2.convexHull(points))
+            if w * h > 0 and hull_area / (w * h) >= 0.97:
+                # Rectangle angle conventions differ between OpenCV versions;
+                # fold into (-45, 45] to get the tilt of the nearest axis
+                return ((angle + 45) % 90) - 45
+        
+        # Detect lines using Hough transform
+        lines = gpu.hough_lines(edges, 1, np.pi / 180, 200)
+        if lines is None:
+            return None
+        
+        angles = np.degrees(lines[:, 0, 1]) - 90
+        angles = angles[(angles > -45) & (angles < 45)]
+        if not len(angles):
+            return None
+        
+        return float(np.median(angles))
+    
     async def extract_scale(self, image: np.ndarray) -> Optional[float]:
         """
         استخراج المقياس من الصورة
@@ -173,7 +234,7 @@ class ImageProcessor:
     
     async def create_binary(self, image: np.ndarray) -> np.ndarray:
         """إنشاء صورة ثنائية للكشف"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         _, binary = cv2.threshold(
             gray, 0, 255,
             cv2.THRESH_BINARY + cv2.THRESH_OTSU
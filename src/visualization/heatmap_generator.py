@@ -8,11 +8,12 @@ Generates visual heatmap overlays for:
 - Error Hotspots (navigation difficulty)
 """
 
+import asyncio
 import numpy as np
 import cv2
 from typing import Dict, List, Any, Tuple
 import logging
-from scipy.interpolate import griddata
+from scipy.spatial import cKDTree
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 
@@ -23,6 +24,9 @@ logger = logging.getLogger(__name__)
 class HeatmapGenerator:
     """Generate heatmap visualizations for wayfinding metrics"""
     
+    # Point heatmaps are interpolated on a GRID_SIZE x GRID_SIZE grid
+    GRID_SIZE = 128
+    
     def __init__(self, floor_plan_image: np.ndarray, scale_px_per_meter: float):
         """
         Initialize heatmap generator
@@ -31,9 +35,21 @@ class HeatmapGenerator:
             floor_plan_image: Base floor plan image
             scale_px_per_meter: Pixels per meter conversion
         """
+        # Overlays are blended in color
+        if floor_plan_image.ndim == 2:
+            floor_plan_image = cv2.cvtColor(floor_plan_image, cv2.COLOR_GRAY2BGR)
         self.floor_plan = floor_plan_image
         self.scale = scale_px_per_meter
         self.height, self.width = floor_plan_image.shape[:2]
+        
+        # Interpolation grid for point heatmaps (rows follow y, like the
+        # image, so it resizes straight onto the floor plan)
+        grid_y, grid_x = np.mgrid[
+            0:self.height - 1:self.GRID_SIZE * 1j,
+            0:self.width - 1:self.GRID_SIZE * 1j
+        ]
+        self._grid_shape = grid_x.shape
+        self._grid_points = np.column_stack((grid_x.ravel(), grid_y.ravel()))
     
     async def generate_all_heatmaps(
         self,
@@ -46,43 +62,34 @@ class HeatmapGenerator:
         import os
         os.makedirs(output_dir, exist_ok=True)
         
-        heatmaps = {}
-        
-        # Betweenness heatmap
-        logger.info("Generating betweenness heatmap...")
-        betweenness_path = os.path.join(output_dir, "betweenness_heatmap.png")
-        await self.generate_betweenness_heatmap(
-            space_syntax_results.get('betweenness', {}),
-            betweenness_path
-        )
-        heatmaps['betweenness'] = betweenness_path
-        
-        # Integration heatmap
-        logger.info("Generating integration heatmap...")
-        integration_path = os.path.join(output_dir, "integration_heatmap.png")
-        await self.generate_integration_heatmap(
-            space_syntax_results.get('integration', {}),
-            integration_path
-        )
-        heatmaps['integration'] = integration_path
-        
-        # VGA heatmap
-        logger.info("Generating VGA heatmap...")
-        vga_path = os.path.join(output_dir, "vga_heatmap.png")
-        await self.generate_vga_heatmap(
-            vga_results.get('metrics', {}).get('visual_integration', {}),
-            vga_path
-        )
-        heatmaps['vga'] = vga_path
+        heatmaps = {
+            'betweenness': os.path.join(output_dir, "betweenness_heatmap.png"),
+            'integration': os.path.join(output_dir, "integration_heatmap.png"),
+            'vga': os.path.join(output_dir, "vga_heatmap.png"),
+            'errors': os.path.join(output_dir, "error_hotspots.png")
+        }
         
-        # Error hotspots
-        logger.info("Generating error hotspots heatmap...")
-        errors_path = os.path.join(output_dir, "error_hotspots.png")
-        await self.generate_error_heatmap(
-            agent_simulation_results,
-            errors_path
+        # The PNG encodes run in threads, so each one overlaps with drawing
+        # the next heatmap
+        logger.info("Generating betweenness, integration, VGA and error heatmaps...")
+        await asyncio.gather(
+            self.generate_betweenness_heatmap(
+                space_syntax_results.get('betweenness', {}),
+                heatmaps['betweenness']
+            ),
+            self.generate_integration_heatmap(
+                space_syntax_results.get('integration', {}),
+                heatmaps['integration']
+            ),
+            self.generate_vga_heatmap(
+                vga_results.get('metrics', {}).get('visual_integration', {}),
+                heatmaps['vga']
+            ),
+            self.generate_error_heatmap(
+                agent_simulation_results,
+                heatmaps['errors']
+            )
         )
-        heatmaps['errors'] = errors_path
         
         logger.info(f"All heatmaps generated in {output_dir}")
         return heatmaps
@@ -99,7 +106,7 @@ class HeatmapGenerator:
             title='Betweenness Centrality (Bottlenecks)',
             label='High Traffic'
         )
-        cv2.imwrite(output_path, heatmap)
+        await asyncio.to_thread(cv2.imwrite, output_path, heatmap)
     
     async def generate_integration_heatmap(
         self,
@@ -115,7 +122,7 @@ class HeatmapGenerator:
             label='Well Connected',
             invert=True  # Lower RRA = higher integration
         )
-        cv2.imwrite(output_path, heatmap)
+        await asyncio.to_thread(cv2.imwrite, output_path, heatmap)
     
     async def generate_vga_heatmap(
         self,
@@ -129,7 +136,7 @@ class HeatmapGenerator:
             title='Visual Integration (Visibility Quality)',
             label='High Visibility'
         )
-        cv2.imwrite(output_path, heatmap)
+        await asyncio.to_thread(cv2.imwrite, output_path, heatmap)
     
     async def generate_error_heatmap(
         self,
@@ -154,7 +161,7 @@ class HeatmapGenerator:
             title='Error Hotspots (Navigation Difficulty)',
             label='High Error Rate'
         )
-        cv2.imwrite(output_path, heatmap)
+        await asyncio.to_thread(cv2.imwrite, output_path, heatmap)
     
     async def _create_node_heatmap(
         self,
@@ -165,11 +172,8 @@ class HeatmapGenerator:
         invert: bool = False
     ) -> np.ndarray:
         """Create heatmap from node-based data"""
-        # Create overlay
-        overlay = self.floor_plan.copy()
-        
         if not node_data:
-            return overlay
+            return self.floor_plan.copy()
         
         # Normalize values
         values = np.array(list(node_data.values()))
@@ -179,31 +183,35 @@ class HeatmapGenerator:
         vmin, vmax = values.min(), values.max()
         norm_values = (values - vmin) / (vmax - vmin + 1e-8)
         
-        # Get colormap
+        # Node positions, colors and radii for all nodes at once
+        positions, valid = self._parse_node_positions(node_data.keys())
         cmap = cm.get_cmap(colormap)
+        colors_bgr = (cmap(norm_values)[:, [2, 1, 0]] * 255).astype(np.int32)
+        radii = np.maximum(10, (norm_values * 30).astype(np.int32))
+        positions, radii, colors_bgr = positions[valid], radii[valid], colors_bgr[valid]
         
-        # Draw colored circles at node positions
-        for i, (node, value) in enumerate(node_data.items()):
-            # Parse node position (assuming format "node_x_y")
-            try:
-                parts = node.split('_')
-                if len(parts) >= 3:
-                    x, y = int(parts[-2]), int(parts[-1])
-                else:
-                    continue
-            except:
-                continue
-            
-            # Get color
-            color = cmap(norm_values[i])
-            color_bgr = (int(color[2]*255), int(color[1]*255), int(color[0]*255))
-            
-            # Draw circle
-            radius = max(10, int(norm_values[i] * 30))
-            cv2.circle(overlay, (x, y), radius, color_bgr, -1)
+        result = self.floor_plan.copy()
         
-        # Blend with original
-        result = cv2.addWeighted(self.floor_plan, 0.6, overlay, 0.4, 0)
+        # Only the region the circles cover is drawn and blended; the rest of
+        # the blend would just reproduce the floor plan
+        if len(positions):
+            x0, y0 = np.maximum((positions - radii[:, None]).min(axis=0), 0)
+            x1, y1 = np.minimum(
+                (positions + radii[:, None]).max(axis=0) + 1, (self.width, self.height)
+            )
+            if x0 < x1 and y0 < y1:
+                base = self.floor_plan[y0:y1, x0:x1]
+                overlay = base.copy()
+                
+                # Draw colored circles at node positions (in node order, so
+                # overlapping circles stack as before)
+                for (x, y), radius, color_bgr in zip(
+                    positions.tolist(), radii.tolist(), colors_bgr.tolist()
+                ):
+                    cv2.circle(overlay, (x - x0, y - y0), radius, color_bgr, -1)
+                
+                # Blend with original
+                result[y0:y1, x0:x1] = cv2.addWeighted(base, 0.6, overlay, 0.4, 0)
         
         # Add title
         if title:
@@ -212,6 +220,36 @@ class HeatmapGenerator:
         
         return result
     
+    @staticmethod
+    def _idw(points: np.ndarray, values: np.ndarray, query: np.ndarray, k: int = 8) -> np.ndarray:
+        """Inverse-distance-weighted interpolation from the k nearest points"""
+        k = min(k, len(points))
+        distances, idx = cKDTree(points).query(query, k=k)
+        distances = distances.reshape(len(query), k)
+        idx = idx.reshape(len(query), k)
+        
+        weights = 1.0 / (distances.astype(values.dtype) + 1e-6)
+        return (weights * values[idx]).sum(axis=1) / weights.sum(axis=1)
+    
+    @staticmethod
+    def _parse_node_positions(nodes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Parse node keys of the form "node_x_y" into an (N, 2) int array
+        
+        Returns the positions and a mask of the keys that parsed.
+        """
+        positions = []
+        valid = []
+        for node in nodes:
+            try:
+                parts = node.split('_')
+                positions.append((int(parts[-2]), int(parts[-1])))
+                valid.append(len(parts) >= 3)
+            except (AttributeError, ValueError, IndexError):
+                positions.append((0, 0))
+                valid.append(False)
+        return np.array(positions, dtype=np.int32).reshape(-1, 2), np.array(valid, dtype=bool)
+    
     async def _create_point_heatmap(
         self,
         point_data: Dict[str, float],
@@ -241,22 +279,19 @@ class HeatmapGenerator:
         if not points:
             return overlay
         
+        # Values, weights and the grid stay float32 through to the colormap
         points = np.array(points)
-        values = np.array(values)
-        
-        # Create grid
-        grid_x, grid_y = np.mgrid[0:self.width:100, 0:self.height:100]
+        values = np.array(values, dtype=np.float32)
         
-        # Interpolate
-        grid_z = griddata(points, values, (grid_x, grid_y), method='cubic', fill_value=0)
+        # Interpolate: inverse-distance weighting over the nearest points
+        grid_z = self._idw(points, values, self._grid_points).reshape(self._grid_shape)
         
         # Normalize
         grid_z = (grid_z - grid_z.min()) / (grid_z.max() - grid_z.min() + 1e-8)
         
         # Apply colormap
         cmap = cm.get_cmap(colormap)
-        colored = cmap(grid_z)
-        colored = (colored[:, :, :3] * 255).astype(np.uint8)
+        colored = cv2.cvtColor(cmap(grid_z, bytes=True), cv2.COLOR_RGBA2BGR)
         
         # Resize to match floor plan
         colored = cv2.resize(colored, (self.width, self.height))
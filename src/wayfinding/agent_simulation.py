@@ -2,8 +2,11 @@
 Agent-Based Simulation - محاكاة سلوك المستخدم
 Based on: Huang et al. (2017), Hölscher et al. (2006)
 """
+import asyncio
+from concurrent.futures import Executor
 import numpy as np
 import networkx as nx
+from scipy.sparse.csgraph import dijkstra
 from typing import Dict, List, Any, Tuple, Optional
 from loguru import logger
 from dataclasses import dataclass
@@ -18,20 +21,209 @@ class AgentType(Enum):
     MOBILITY_IMPAIRED = "mobility_impaired"  # محدود الحركة
 
 
+# توزيع أنواع الوكلاء - الرمز الرقمي هو الموضع في _AGENT_TYPES
+_AGENT_TYPES = (
+    AgentType.FIRST_TIME,
+    AgentType.FAMILIAR,
+    AgentType.ELDERLY,
+    AgentType.MOBILITY_IMPAIRED
+)
+_TYPE_PROBS = np.array([0.6, 0.2, 0.15, 0.05])
+
+# احتمال الخطأ الأساسي وسرعة المشي (م/ث) لكل نوع - بنفس ترتيب _AGENT_TYPES
+_BASE_ERROR_PROB = np.array([0.25, 0.05, 0.35, 0.30])
+_WALKING_SPEED = np.array([1.0, 1.4, 0.8, 0.6])
+
+
 @dataclass
-class Agent:
-    """وكيل يمثل مستخدم"""
-    id: str
-    agent_type: AgentType
-    current_position: Tuple[float, float]
-    target_position: Tuple[float, float]
-    path: List[Tuple[float, float]] = None
-    errors: int = 0
-    hesitations: int = 0
-    sign_usages: int = 0
-    time_elapsed: float = 0
-    distance_traveled: float = 0
-    success: bool = False
+class ScenarioState:
+    """
+    حالة وكلاء سيناريو واحد - مصفوفة لكل مقياس (عنصر لكل وكيل)
+    
+    Struct-of-arrays: aggregation reduces each metric over one contiguous
+    array instead of walking a list of agent objects.
+    """
+    errors: np.ndarray
+    hesitations: np.ndarray
+    sign_usages: np.ndarray
+    time_elapsed: np.ndarray
+    distance_traveled: np.ndarray
+    success: np.ndarray
+    agent_type: np.ndarray  # رمز النوع (فهرس في _AGENT_TYPES)
+    
+    @classmethod
+    def empty(cls, n_agents: int) -> "ScenarioState":
+        return cls(
+            errors=np.zeros(n_agents, dtype=np.int32),
+            hesitations=np.zeros(n_agents, dtype=np.int32),
+            sign_usages=np.zeros(n_agents, dtype=np.int32),
+            time_elapsed=np.zeros(n_agents, dtype=np.float64),
+            distance_traveled=np.zeros(n_agents, dtype=np.float64),
+            success=np.zeros(n_agents, dtype=bool),
+            agent_type=np.zeros(n_agents, dtype=np.int8)
+        )
+
+
+def _scenario_origin(scenario: Dict[str, Any]):
+    """نقطة بداية السيناريو ("origin"، أو "start" كما ترسلها الواجهات)"""
+    return scenario.get("origin", scenario.get("start"))
+
+
+def _route(next_hop: np.ndarray, node: int, destination: int) -> List[int]:
+    """إعادة بناء المسار من عقدة حتى الوجهة"""
+    path = [node]
+    while node != destination:
+        node = int(next_hop[node])
+        path.append(node)
+    return path
+
+
+def _simulate_agents(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    weights: np.ndarray,
+    error_table: np.ndarray,
+    is_signage: np.ndarray,
+    next_hop: np.ndarray,
+    hop_weight: np.ndarray,
+    optimal_path: List[int],
+    destination: int,
+    state: ScenarioState,
+    error_rolls: np.ndarray,
+    neighbor_rolls: np.ndarray
+):
+    """
+    محاكاة رحلات كل الوكلاء على المسار الأمثل (النتائج في state)
+    
+    Plain function over typed arrays: each agent follows the optimal path,
+    may take a random wrong turn at any step (probability from
+    error_table[type, node]) and then re-routes to the destination via
+    next_hop. All random draws come pre-generated as
+    (n_agents, n_steps) matrices in [0, 1). Distance is accumulated edge by
+    edge as the agent moves (hop_weight[node] is the weight of the edge
+    node -> next_hop[node]); travel time is left to the caller.
+    """
+    for i in range(len(state.agent_type)):
+        t = state.agent_type[i]
+        current = optimal_path[0]
+        distance = 0
+        
+        for step, next_node in enumerate(optimal_path[1:]):
+            # احتمال الخطأ عند نقاط القرار
+            if error_rolls[i, step] < error_table[t, current]:
+                # خطأ في الاختيار - اختيار عشوائي من الجيران
+                state.errors[i] += 1
+                start = indptr[current]
+                n_neighbors = indptr[current + 1] - start
+                if n_neighbors:
+                    k = start + int(neighbor_rolls[i, step] * n_neighbors)
+                    wrong_choice = int(indices[k])
+                    distance += weights[k]
+                    current = wrong_choice
+                    
+                    # محاولة التصحيح
+                    if wrong_choice != next_node:
+                        state.hesitations[i] += 1
+                        if wrong_choice == destination or next_hop[wrong_choice] >= 0:
+                            while current != destination:
+                                distance += hop_weight[current]
+                                current = int(next_hop[current])
+                        break
+            else:
+                # اختيار صحيح - فحص استخدام الإشارات
+                if is_signage[current] or is_signage[next_node]:
+                    state.sign_usages[i] += 1
+                distance += hop_weight[current]
+                current = next_node
+        
+        state.distance_traveled[i] = distance
+        state.success[i] = current == destination
+
+
+def _simulate_scenario(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    weights: np.ndarray,
+    error_table: np.ndarray,
+    is_signage: np.ndarray,
+    next_hop: np.ndarray,
+    hop_weight: np.ndarray,
+    origin: int,
+    destination: int,
+    n_agents: int,
+    rng: np.random.Generator
+) -> Dict[str, Any]:
+    """
+    تشغيل سيناريو واحد مع عدة وكلاء (الوجهة قابلة للوصول من الأصل)
+    
+    Runs in a CPU worker process: the network arrays, the next-hop table
+    and the scenario's Generator all arrive as arguments.
+    """
+    state = ScenarioState.empty(n_agents)
+    
+    # اختيار أنواع كل الوكلاء دفعة واحدة
+    state.agent_type[:] = rng.choice(len(_AGENT_TYPES), size=n_agents, p=_TYPE_PROBS)
+    
+    # المسار الأمثل مشترك بين كل الوكلاء
+    shortest_path = _route(next_hop, origin, destination)
+    n_steps = len(shortest_path) - 1
+    
+    # تشغيل رحلات الوكلاء
+    _simulate_agents(
+        indptr,
+        indices,
+        weights,
+        error_table,
+        is_signage,
+        next_hop,
+        hop_weight,
+        shortest_path,
+        destination,
+        state,
+        rng.random((n_agents, n_steps)),
+        rng.random((n_agents, n_steps))
+    )
+    
+    # زمن السفر (بالثواني): المسافة / السرعة + 5 ث لكل تردد + 10 ث لكل خطأ
+    state.time_elapsed[:] = (
+        state.distance_traveled / _WALKING_SPEED[state.agent_type]
+        + state.hesitations * 5
+        + state.errors * 10
+    )
+    
+    # تجميع النتائج
+    return _aggregate_scenario_results(state)
+
+
+def _aggregate_scenario_results(state: ScenarioState) -> Dict[str, Any]:
+    """
+    تجميع نتائج السيناريو
+    """
+    n_agents = len(state.success)
+    if not n_agents:
+        return {}
+    
+    success = state.success
+    any_success = bool(success.any())
+    hesitation_rate = np.divide(
+        state.hesitations,
+        state.distance_traveled,
+        out=np.zeros(n_agents),
+        where=state.distance_traveled > 0
+    )
+    
+    return {
+        "n_agents": n_agents,
+        "success_rate": float(success.mean()),
+        "first_pass_success_rate": float((success & (state.errors == 0)).mean()),
+        "mean_time": float(state.time_elapsed[success].mean()) if any_success else 0,
+        "std_time": float(state.time_elapsed[success].std()) if any_success else 0,
+        "mean_distance": float(state.distance_traveled[success].mean()) if any_success else 0,
+        "mean_errors": float(state.errors.mean()),
+        "mean_hesitations": float(state.hesitations.mean()),
+        "mean_sign_usage": float(state.sign_usages.mean()),
+        "hesitation_rate": float(hesitation_rate.mean())
+    }
 
 
 class AgentSimulator:
@@ -41,7 +233,20 @@ class AgentSimulator:
         self.graph = None
         self.signage_locations = []
         self.landmarks = []
-        self.agents = []
+        self._rng = np.random.default_rng()
+        self._next_hops = {}
+        
+        # تمثيل الشبكة بأرقام صحيحة (CSR) - يبنى في simulate
+        self._node_idx = {}
+        self._csr = None
+        self._indptr = None
+        self._indices = None
+        self._weights = None
+        self._edge_keys = None
+        self._degree = None
+        self._is_signage = None
+        self._is_landmark = None
+        self._error_table = None
     
     async def simulate(
         self,
@@ -49,7 +254,8 @@ class AgentSimulator:
         scenarios: List[Dict[str, Any]],
         n_agents_per_scenario: int = 100,
         signage_locations: List = None,
-        landmarks: List = None
+        landmarks: List = None,
+        executor: Optional[Executor] = None
     ) -> Dict[str, Any]:
         """
         تشغيل محاكاة Agent-Based
@@ -60,6 +266,8 @@ class AgentSimulator:
             n_agents_per_scenario: عدد الوكلاء لكل سيناريو
             signage_locations: مواقع الإشارات
             landmarks: المعالم البارزة
+            executor: مجمع العمليات لتشغيل السيناريوهات بالتوازي
+                      (None = مجمع الخيوط الافتراضي)
         
         Returns:
             نتائج المحاكاة
@@ -70,37 +278,50 @@ class AgentSimulator:
             self.graph = graph
             self.signage_locations = signage_locations or []
             self.landmarks = landmarks or []
+            self._build_arrays()
             
-            all_results = []
+            # السيناريوهات مستقلة: ولكل منها مولد عشوائي خاص، وتعمل بالتوازي
+            # في مجمع العمليات (the agent loop is pure Python and holds the
+            # GIL, so only separate processes run scenarios in parallel)
+            scenario_rngs = self._rng.spawn(len(scenarios))
+            scenario_results = await asyncio.gather(*(
+                self._run_scenario(
+                    _scenario_origin(scenario),
+                    scenario.get("destination"),
+                    n_agents_per_scenario,
+                    rng,
+                    executor
+                )
+                for scenario, rng in zip(scenarios, scenario_rngs)
+            ))
             
-            for scenario in scenarios:
-                origin = scenario.get("origin")
+            all_results = []
+            for scenario, results in zip(scenarios, scenario_results):
+                origin = _scenario_origin(scenario)
                 destination = scenario.get("destination")
-                scenario_name = scenario.get("name", f"{origin}->{destination}")
-                
-                logger.info(f"Simulating scenario: {scenario_name}")
-                
-                # تشغيل عدة وكلاء لنفس السيناريو
-                scenario_results = await self._run_scenario(
-                    origin,
-                    destination,
-                    n_agents_per_scenario
-                )
-                
                 all_results.append({
-                    "scenario": scenario_name,
+                    "scenario": scenario.get("name", f"{origin}->{destination}"),
                     "origin": origin,
                     "destination": destination,
-                    **scenario_results
+                    **results
                 })
             
             # حساب الإحصائيات الإجمالية
-            overall_stats = await self._calculate_overall_stats(all_results)
+            overall_stats = self._calculate_overall_stats(all_results)
             
+            # المستهلكون (WES، التوصيات، الخرائط الحرارية) يقرؤون السيناريوهات
+            # كقاموس بالاسم مع "aggregate_metrics"
             result = {
-                "scenarios": all_results,
+                "scenarios": {
+                    r["scenario"]: {
+                        "origin": r["origin"],
+                        "destination": r["destination"],
+                        "aggregate_metrics": results
+                    }
+                    for r, results in zip(all_results, scenario_results)
+                },
                 "overall": overall_stats,
-                "recommendations": await self._generate_recommendations(all_results)
+                "recommendations": self._generate_recommendations(all_results)
             }
             
             logger.info("✅ Agent simulation completed")
@@ -110,255 +331,128 @@ class AgentSimulator:
             logger.error(f"❌ Error in agent simulation: {str(e)}")
             raise
     
-    async def _run_scenario(
-        self,
-        origin: str,
-        destination: str,
-        n_agents: int
-    ) -> Dict[str, Any]:
-        """
-        تشغيل سيناريو واحد مع عدة وكلاء
+    def _build_arrays(self):
         """
-        agents = []
+        بناء مصفوفات CSR وأقنعة الإشارات/المعالم بأرقام عقد صحيحة
         
-        # توزيع أنواع الوكلاء
-        agent_types_dist = [
-            (AgentType.FIRST_TIME, 0.6),
-            (AgentType.FAMILIAR, 0.2),
-            (AgentType.ELDERLY, 0.15),
-            (AgentType.MOBILITY_IMPAIRED, 0.05)
-        ]
-        
-        for i in range(n_agents):
-            # اختيار نوع الوكيل
-            agent_type = np.random.choice(
-                [at for at, _ in agent_types_dist],
-                p=[prob for _, prob in agent_types_dist]
-            )
-            
-            # إنشاء وكيل
-            agent = Agent(
-                id=f"agent_{i}",
-                agent_type=agent_type,
-                current_position=self._get_node_position(origin),
-                target_position=self._get_node_position(destination)
-            )
-            
-            # تشغيل رحلة الوكيل
-            await self._simulate_agent_journey(agent, origin, destination)
-            
-            agents.append(agent)
-        
-        # تجميع النتائج
-        return await self._aggregate_scenario_results(agents)
-    
-    def _get_node_position(self, node: str) -> Tuple[float, float]:
-        """الحصول على موقع عقدة"""
-        if node in self.graph.nodes:
-            return self.graph.nodes[node].get('pos', (0, 0))
-        return (0, 0)
-    
-    async def _simulate_agent_journey(
-        self,
-        agent: Agent,
-        origin: str,
-        destination: str
-    ):
-        """
-        محاكاة رحلة وكيل من الأصل للوجهة
-        """
-        try:
-            # حساب أقصر مسار
-            if origin not in self.graph or destination not in self.graph:
-                agent.success = False
-                return
-            
-            shortest_path = nx.shortest_path(
-                self.graph, origin, destination, weight='weight'
-            )
-            
-            # تطبيق قواعد اختيار المسار حسب نوع الوكيل
-            actual_path = await self._apply_agent_strategy(
-                agent,
-                shortest_path,
-                destination
-            )
-            
-            # حساب المقاييس
-            agent.path = actual_path
-            agent.distance_traveled = await self._calculate_path_length(actual_path)
-            agent.time_elapsed = await self._estimate_travel_time(agent, actual_path)
-            agent.success = (actual_path[-1] == destination if actual_path else False)
-            
-        except Exception as e:
-            logger.warning(f"Agent {agent.id} failed: {e}")
-            agent.success = False
-    
-    async def _apply_agent_strategy(
-        self,
-        agent: Agent,
-        optimal_path: List[str],
-        destination: str
-    ) -> List[str]:
-        """
-        تطبيق استراتيجية اختيار المسار حسب نوع الوكيل
+        Hot-loop lookups (neighbors, degree, signage, edge weight) become
+        array indexing instead of dict lookups on string node ids.
         """
-        actual_path = [optimal_path[0]]
-        current = optimal_path[0]
+        nodes = list(self.graph.nodes())
+        self._node_idx = {node: i for i, node in enumerate(nodes)}
         
-        for i, next_node in enumerate(optimal_path[1:], 1):
-            # احتمال الخطأ عند نقاط القرار
-            error_prob = self._get_error_probability(agent, current)
-            
-            if np.random.random() < error_prob:
-                # خطأ في الاختيار
-                agent.errors += 1
-                
-                # اختيار عشوائي من الجيران
-                neighbors = list(self.graph.neighbors(current))
-                if neighbors:
-                    wrong_choice = np.random.choice(neighbors)
-                    actual_path.append(wrong_choice)
-                    current = wrong_choice
-                    
-                    # محاولة التصحيح
-                    if wrong_choice != next_node:
-                        agent.hesitations += 1
-                        try:
-                            correction_path = nx.shortest_path(
-                                self.graph, wrong_choice, destination, weight='weight'
-                            )
-                            actual_path.extend(correction_path[1:])
-                            return actual_path
-                        except:
-                            return actual_path
-            else:
-                # اختيار صحيح
-                # فحص استخدام الإشارات
-                if self._signage_visible_at(current, next_node):
-                    agent.sign_usages += 1
-                
-                actual_path.append(next_node)
-                current = next_node
+        csr = nx.to_scipy_sparse_array(self.graph, nodelist=nodes, weight='weight', format='csr')
+        csr.sort_indices()
+        self._csr = csr
+        self._indptr = csr.indptr
+        self._indices = csr.indices
+        self._weights = csr.data.astype(np.float64)
+        # مفتاح فريد لكل ضلع (صف × V + عمود) - مرتب تصاعدياً لأن CSR مرتب
+        rows = np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(csr.indptr))
+        self._edge_keys = rows * len(nodes) + csr.indices
+        self._degree = np.fromiter(
+            (d for _, d in self.graph.degree(nodes)), dtype=np.int32, count=len(nodes)
+        )
         
-        return actual_path
+        self._is_signage = self._node_mask(self.signage_locations)
+        self._is_landmark = self._node_mask(self.landmarks)
+        self._error_table = self._build_error_table()
+        self._next_hops = {}
     
-    def _get_error_probability(self, agent: Agent, node: str) -> float:
+    def _build_error_table(self) -> np.ndarray:
         """
-        حساب احتمال الخطأ عند عقدة
+        احتمال الخطأ لكل (نوع وكيل، عقدة) - مصفوفة (4, V)
         """
-        base_prob = {
-            AgentType.FAMILIAR: 0.05,
-            AgentType.FIRST_TIME: 0.25,
-            AgentType.ELDERLY: 0.35,
-            AgentType.MOBILITY_IMPAIRED: 0.30
-        }
-        
-        prob = base_prob.get(agent.agent_type, 0.20)
-        
         # زيادة الاحتمال عند عقد عالية الدرجة (تفرع كبير)
-        degree = self.graph.degree(node)
-        if degree >= 4:
-            prob *= 1.5
-        elif degree >= 3:
-            prob *= 1.2
+        degree_mult = np.where(self._degree >= 4, 1.5, np.where(self._degree >= 3, 1.2, 1.0))
+        # تقليل الاحتمال عند وجود إشارة أو معلم بارز
+        sign_mult = np.where(self._is_signage, 0.5, 1.0)
+        landmark_mult = np.where(self._is_landmark, 0.6, 1.0)
         
-        # تقليل الاحتمال إذا كانت هناك إشارة
-        if self._has_signage_at(node):
-            prob *= 0.5
-        
-        # تقليل الاحتمال إذا كان هناك معلم بارز
-        if self._has_landmark_at(node):
-            prob *= 0.6
-        
-        return min(prob, 0.9)  # حد أقصى 90%
-    
-    def _signage_visible_at(self, current: str, next_node: str) -> bool:
-        """فحص إذا كانت الإشارة مرئية"""
-        # تبسيط: نفترض وجود إشارة إذا كانت في قائمة الإشارات
-        return current in self.signage_locations or next_node in self.signage_locations
-    
-    def _has_signage_at(self, node: str) -> bool:
-        """فحص وجود إشارة عند عقدة"""
-        return node in self.signage_locations
+        # Same multiplication order as the per-step rule it replaces
+        table = _BASE_ERROR_PROB[:, None] * degree_mult
+        table *= sign_mult
+        table *= landmark_mult
+        return np.minimum(table, 0.9)  # حد أقصى 90%
     
-    def _has_landmark_at(self, node: str) -> bool:
-        """فحص وجود معلم عند عقدة"""
-        return node in self.landmarks
-    
-    async def _calculate_path_length(self, path: List[str]) -> float:
-        """حساب طول المسار"""
-        if len(path) < 2:
-            return 0
-        
-        total_length = 0
-        for i in range(len(path) - 1):
-            if path[i] in self.graph and path[i+1] in self.graph:
-                if self.graph.has_edge(path[i], path[i+1]):
-                    total_length += self.graph[path[i]][path[i+1]].get('weight', 1)
-        
-        return total_length
+    def _node_mask(self, names: List) -> np.ndarray:
+        """قناع منطقي للعقد الموجودة في القائمة"""
+        mask = np.zeros(len(self._node_idx), dtype=bool)
+        idx = [self._node_idx[n] for n in names if n in self._node_idx]
+        mask[idx] = True
+        return mask
     
-    async def _estimate_travel_time(
+    async def _run_scenario(
         self,
-        agent: Agent,
-        path: List[str]
-    ) -> float:
-        """
-        تقدير زمن السفر (بالثواني)
+        origin: str,
+        destination: str,
+        n_agents: int,
+        rng: np.random.Generator,
+        executor: Optional[Executor]
+    ) -> Dict[str, Any]:
         """
-        distance = await self._calculate_path_length(path)
-        
-        # سرعة المشي (م/ث)
-        walking_speed = {
-            AgentType.FAMILIAR: 1.4,
-            AgentType.FIRST_TIME: 1.0,
-            AgentType.ELDERLY: 0.8,
-            AgentType.MOBILITY_IMPAIRED: 0.6
-        }
-        
-        speed = walking_speed.get(agent.agent_type, 1.0)
+        تشغيل سيناريو واحد مع عدة وكلاء
         
-        # الزمن الأساسي
-        base_time = distance / speed
+        The next-hop table is built here (cached per destination) and the
+        agents are simulated in the executor.
+        """
+        logger.info(f"Simulating scenario: {origin}->{destination}")
         
-        # إضافة زمن التوقف والتردد
-        hesitation_time = agent.hesitations * 5  # 5 ثوانٍ لكل تردد
-        error_time = agent.errors * 10  # 10 ثوانٍ لكل خطأ
+        # أقصر مسار يحسب مرة واحدة لكل وجهة ويشترك فيه كل الوكلاء
+        src = self._node_idx.get(origin)
+        dst = self._node_idx.get(destination)
+        if src is None or dst is None:
+            return _aggregate_scenario_results(ScenarioState.empty(n_agents))
         
-        total_time = base_time + hesitation_time + error_time
+        next_hop, hop_weight = self._next_hop_table(dst)
+        if src != dst and next_hop[src] < 0:
+            logger.warning(f"No path from {origin} to {destination}")
+            return _aggregate_scenario_results(ScenarioState.empty(n_agents))
         
-        return total_time
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor,
+            _simulate_scenario,
+            self._indptr,
+            self._indices,
+            self._weights,
+            self._error_table,
+            self._is_signage,
+            next_hop,
+            hop_weight,
+            src,
+            dst,
+            n_agents,
+            rng
+        )
     
-    async def _aggregate_scenario_results(
-        self,
-        agents: List[Agent]
-    ) -> Dict[str, Any]:
-        """
-        تجميع نتائج السيناريو
+    def _next_hop_table(self, destination: int) -> Tuple[np.ndarray, np.ndarray]:
         """
-        successful = [a for a in agents if a.success]
-        
-        if not agents:
-            return {}
+        جدول الخطوة التالية نحو الوجهة لكل عقدة (-1 إذا تعذر الوصول)
+        ووزن الضلع إليها
         
-        return {
-            "n_agents": len(agents),
-            "success_rate": len(successful) / len(agents),
-            "first_pass_success": sum(1 for a in agents if a.success and a.errors == 0) / len(agents),
-            "mean_time": float(np.mean([a.time_elapsed for a in successful])) if successful else 0,
-            "std_time": float(np.std([a.time_elapsed for a in successful])) if successful else 0,
-            "mean_distance": float(np.mean([a.distance_traveled for a in successful])) if successful else 0,
-            "mean_errors": float(np.mean([a.errors for a in agents])),
-            "mean_hesitations": float(np.mean([a.hesitations for a in agents])),
-            "mean_sign_usage": float(np.mean([a.sign_usages for a in agents])),
-            "hesitation_rate": float(np.mean([
-                a.hesitations / a.distance_traveled if a.distance_traveled > 0 else 0
-                for a in agents
-            ]))
-        }
+        One Dijkstra from the destination over the transposed CSR replaces a
+        shortest_path call per agent and per correction. Tables are cached
+        per destination for the current simulation.
+        """
+        table = self._next_hops.get(destination)
+        if table is None:
+            _, pred = dijkstra(
+                self._csr.T, directed=True, indices=destination, return_predecessors=True
+            )
+            next_hop = np.where(pred < 0, -1, pred).astype(np.int32)
+            
+            hop_weight = np.zeros(len(next_hop))
+            nodes = np.flatnonzero(next_hop >= 0)
+            n_nodes = len(next_hop)
+            edges = np.searchsorted(self._edge_keys, nodes * n_nodes + next_hop[nodes])
+            hop_weight[nodes] = self._weights[edges]
+            
+            table = (next_hop, hop_weight)
+            self._next_hops[destination] = table
+        return table
     
-    async def _calculate_overall_stats(
+    def _calculate_overall_stats(
         self,
         all_results: List[Dict]
     ) -> Dict[str, Any]:
@@ -377,7 +471,7 @@ class AgentSimulator:
             "worst_scenario": min(all_results, key=lambda x: x.get("success_rate", 0)).get("scenario")
         }
     
-    async def _generate_recommendations(
+    def _generate_recommendations(
         self,
         all_results: List[Dict]
     ) -> List[str]:
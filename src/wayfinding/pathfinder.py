@@ -4,6 +4,7 @@ Pathfinder - محلل المسارات
 """
 import networkx as nx
 import numpy as np
+from scipy.sparse.csgraph import connected_components, shortest_path
 from typing import Dict, List, Any
 from loguru import logger
 
@@ -13,8 +14,10 @@ class PathFinder:
     
     def __init__(self):
         self.graph = None
+        self._nodes = []
+        self._degree = np.zeros(0, dtype=np.int64)
     
-    async def analyze(self, elements: Dict, areas: Dict) -> Dict[str, Any]:
+    def analyze(self, elements: Dict, areas: Dict) -> Dict[str, Any]:
         """
         تحليل مسارات الحركة
         
@@ -29,21 +32,28 @@ class PathFinder:
             logger.info("🚶 Analyzing pathfinding...")
             
             # Build room graph
-            self.graph = await self._build_graph(elements)
+            self.graph = self._build_graph(elements)
+            
+            # Node order and degree vector, shared by the metrics below
+            self._nodes = list(self.graph.nodes())
+            self._degree = np.fromiter(
+                (d for _, d in self.graph.degree()), dtype=np.int64, count=len(self._nodes)
+            )
             
             # Calculate metrics
-            metrics = await self._calculate_path_metrics()
+            metrics = self._calculate_path_metrics()
             
             # Find decision points
-            decision_points = await self._find_decision_points()
+            decision_points = self._find_decision_points()
             
             result = {
                 "avg_path_length": metrics.get("avg_path", 0),
                 "avg_turns": metrics.get("avg_turns", 0),
                 "decision_points": len(decision_points),
                 "decision_locations": decision_points,
-                "complexity_score": await self._calculate_complexity(),
-                "connectivity": metrics.get("connectivity", 0)
+                "complexity_score": self._calculate_complexity(),
+                "connectivity": metrics.get("connectivity", 0),
+                "min_degree": metrics.get("min_degree", 0)
             }
             
             return result
@@ -52,70 +62,81 @@ class PathFinder:
             logger.error(f"❌ Error analyzing pathfinding: {str(e)}")
             return {}
     
-    async def _build_graph(self, elements: Dict) -> nx.Graph:
+    def _build_graph(self, elements: Dict) -> nx.Graph:
         """بناء شبكة الغرف والممرات"""
         G = nx.Graph()
         
-        # Add rooms as nodes
+        # Add rooms as nodes (one bulk insert)
         rooms = elements.get("rooms", [])
-        for room in rooms:
-            G.add_node(
+        G.add_nodes_from(
+            (
                 room["id"],
-                pos=(room["centroid"]["x"], room["centroid"]["y"]),
-                area=room["area"]
+                {"pos": (room["centroid"]["x"], room["centroid"]["y"]), "area": room["area"]}
             )
+            for room in rooms
+        )
         
         # Add doors as edges
         doors = elements.get("doors", [])
-        for door in doors:
-            if door.get("from_room") and door.get("to_room"):
-                G.add_edge(
-                    door["from_room"],
-                    door["to_room"],
-                    weight=1.0
-                )
+        G.add_edges_from(
+            (
+                (door["from_room"], door["to_room"])
+                for door in doors
+                if door.get("from_room") and door.get("to_room")
+            ),
+            weight=1.0
+        )
         
         return G
     
-    async def _calculate_path_metrics(self) -> Dict[str, float]:
+    def _calculate_path_metrics(self) -> Dict[str, float]:
         """حساب مقاييس المسارات"""
         if not self.graph or self.graph.number_of_nodes() < 2:
             return {}
         
-        # Average shortest path
-        try:
-            avg_path = nx.average_shortest_path_length(self.graph)
-        except:
+        # Average shortest path (hop count) - one all-pairs BFS in C;
+        # 0 for a disconnected graph, as before
+        n_nodes = self.graph.number_of_nodes()
+        csr = nx.to_scipy_sparse_array(self.graph, format='csr')
+        hops = shortest_path(csr, directed=False, unweighted=True)
+        if np.isfinite(hops).all():
+            avg_path = float(hops.sum() / (n_nodes * (n_nodes - 1)))
+        else:
             avg_path = 0
         
-        # Connectivity
-        connectivity = nx.node_connectivity(self.graph) if self.graph.number_of_nodes() > 1 else 0
+        # Connectivity: 1 if every room is reachable from every other, else 0.
+        # This replaces nx.node_connectivity (a max-flow per node pair); the
+        # minimum degree is reported alongside as an upper bound on it.
+        n_components, _ = connected_components(csr, directed=False)
+        connectivity = 1 if n_components == 1 else 0
+        min_degree = int(self._degree.min())
         
         return {
             "avg_path": round(avg_path, 2),
             "avg_turns": round(avg_path * 0.7, 2),  # Simplified
-            "connectivity": connectivity
+            "connectivity": connectivity,
+            "min_degree": min_degree
         }
     
-    async def _find_decision_points(self) -> List[Dict]:
+    def _find_decision_points(self) -> List[Dict]:
         """إيجاد نقاط القرار (التقاطعات)"""
         if not self.graph:
             return []
         
         decision_points = []
-        for node in self.graph.nodes():
-            degree = self.graph.degree(node)
-            if degree >= 3:  # 3+ connections = decision point
-                pos = self.graph.nodes[node].get("pos", (0, 0))
-                decision_points.append({
-                    "node": node,
-                    "location": {"x": pos[0], "y": pos[1]},
-                    "connections": degree
-                })
+        # 3+ connections = decision point
+        for i in np.flatnonzero(self._degree >= 3):
+            node = self._nodes[i]
+            pos = self.graph.nodes[node].get("pos", (0, 0))
+            decision_points.append({
+                "node": node,
+                "location": {"x": pos[0], "y": pos[1]},
+                "connections": int(self._degree[i])
+            })
         
         return decision_points
     
-    async def _calculate_complexity(self) -> float:
+    def _calculate_complexity(self) -> float:
         """حساب درجة التعقيد"""
         if not self.graph:
             return 0.0
@@ -128,7 +149,7 @@ class PathFinder:
             return 0.0
         
         density = n_edges / (n_nodes * (n_nodes - 1) / 2) if n_nodes > 1 else 0
-        avg_degree = sum(dict(self.graph.degree()).values()) / n_nodes if n_nodes > 0 else 0
+        avg_degree = int(self._degree.sum()) / n_nodes
         
         complexity = (density * 0.5 + avg_degree / 10 * 0.5) * 100
         
@@ -0,0 +1,9 @@
+"""
+Background Workers - العمليات الخلفية
+تشغيل خط التحليل في عمليات منفصلة عن خادم الـ API
+
+Run with: arq src.workers.WorkerSettings
+"""
+from src.workers.tasks import WorkerSettings
+
+__all__ = ["WorkerSettings"]
@@ -0,0 +1,112 @@
+"""
+Worker Tasks - مهام المعالجة الخلفية
+مهام ARQ التي تنفذ خط التحليل خارج حلقة أحداث الـ API
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from arq.connections import RedisSettings
+from loguru import logger
+
+from src.config import settings
+from src.database.job_store import job_store
+from src.api.main import process_floor_plan
+from src.api.main_academic import process_academic_analysis
+
+
+async def startup(ctx: Dict[str, Any]):
+    """تهيئة العامل"""
+    logger.info("🚀 Starting analysis worker...")
+    await job_store.connect()
+    ctx["cpu_pool"] = ProcessPoolExecutor(max_workers=settings.cpu_pool_workers)
+
+
+async def shutdown(ctx: Dict[str, Any]):
+    """إيقاف العامل"""
+    logger.info("🛑 Shutting down analysis worker...")
+    ctx["cpu_pool"].shutdown(wait=True)
+    await job_store.close()
+
+
+@asynccontextmanager
+async def _fail_job_on_cancel(job_id: str):
+    """
+    تعليم المهمة كفاشلة عند إلغائها أو انتهاء مهلتها
+    
+    ARQ cancels the task on job_timeout; CancelledError is not an
+    Exception, so the pipelines' own handlers never see it and the job
+    would stay "processing" forever.
+    """
+    try:
+        yield
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        logger.error(f"⏱️ Job {job_id} cancelled or timed out")
+        await asyncio.shield(job_store.update(job_id, {
+            "status": "failed",
+            "progress": 0,
+            "message": "خطأ: انتهت مهلة المعالجة أو تم إلغاؤها"
+        }))
+        raise
+
+
+async def process_floor_plan_task(
+    ctx: Dict[str, Any],
+    job_id: str,
+    file_path: str,
+    scale: Optional[float],
+    unit: str,
+    building_type: str,
+    enable_color_analysis: bool,
+    cache_key: Optional[str] = None
+):
+    """تحليل مخطط طابق كامل"""
+    async with _fail_job_on_cancel(job_id):
+        await process_floor_plan(
+            job_id,
+            Path(file_path),
+            scale,
+            unit,
+            building_type,
+            enable_color_analysis,
+            executor=ctx["cpu_pool"],
+            cache_key=cache_key
+        )
+
+
+async def process_academic_analysis_task(
+    ctx: Dict[str, Any],
+    job_id: str,
+    file_path: str,
+    scale: float,
+    scenarios: List[Dict],
+    n_agents: int,
+    enable_heatmaps: bool,
+    cache_key: Optional[str] = None
+):
+    """التحليل الأكاديمي للتوجيه"""
+    async with _fail_job_on_cancel(job_id):
+        await process_academic_analysis(
+            job_id,
+            Path(file_path),
+            scale,
+            scenarios,
+            n_agents,
+            enable_heatmaps,
+            cache_key=cache_key,
+            executor=ctx["cpu_pool"]
+        )
+
+
+class WorkerSettings:
+    """إعدادات عامل ARQ"""
+    functions = [process_floor_plan_task, process_academic_analysis_task]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(settings.redis_url)
+    max_jobs = settings.max_concurrent_jobs
+    job_timeout = settings.job_timeout
+    # يحدّث مفتاح الصحة الذي يقرؤه "arq --check" (docker healthcheck)
+    health_check_interval = 30